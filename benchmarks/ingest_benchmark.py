@@ -0,0 +1,238 @@
+"""
+End-to-end ingestion benchmark.
+
+Starts the OpenAI stand-in (benchmarks/openai_stub.py) and the API against a throwaway
+MongoDB database, pushes the PDFs of a directory through /papers/upload/, and reports
+papers per minute, the p50/p99 duration of every ingestion stage and the peak RSS of the
+API process and its extraction workers. Needs a running MongoDB (MONGODB_URL). From the
+root directory:
+
+    python -m benchmarks.ingest_benchmark --papers sample_papers --stub-latency 1.0
+
+Per-stage durations come from the timestamps of the ingestion jobs, so they are only
+reported with --mode background (the default). --mode sync uploads all PDFs in one
+synchronous request and reports its wall time and throughput only.
+
+Settings of the API (INGEST_WORKERS, PDF_EXTRACT_WORKERS, OPENAI_RPM, ...) are taken from
+the environment, so a change to the upload path can be compared by running this before
+and after it. The analysis cache is disabled, so every run makes all of its LLM calls.
+"""
+import argparse
+import math
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+from pymongo import MongoClient
+
+STAGES = ["upload", "extract", "analyze", "store"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile of values, by nearest rank."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants."""
+    pids = [pid]
+    for parent in pids:
+        for task in Path(f"/proc/{parent}/task").glob("*"):
+            try:
+                pids.extend(int(child) for child in (task / "children").read_text().split())
+            except OSError:
+                pass
+    return pids
+
+
+def rss_kb(pid: int, field: str = "VmRSS") -> int:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Samples the total RSS of a process tree, keeping the peak."""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.peak_kb = max(self.peak_kb, sum(rss_kb(pid) for pid in process_tree(self.pid)))
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> int:
+        self._stopped.set()
+        self.join()
+        # The server's own high-water mark catches peaks between samples
+        return max(self.peak_kb, rss_kb(self.pid, "VmHWM"))
+
+
+def start_server(module: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+
+
+def wait_until_up(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            time.sleep(0.2)
+
+
+def stage_durations(jobs: List[Dict]) -> Dict[str, List[float]]:
+    durations = {stage: [] for stage in STAGES}
+    for job in jobs:
+        for stage in STAGES:
+            times = job["stages"].get(stage, {})
+            if times.get("started_at") and times.get("finished_at"):
+                started = datetime.fromisoformat(times["started_at"])
+                finished = datetime.fromisoformat(times["finished_at"])
+                durations[stage].append((finished - started).total_seconds())
+    return durations
+
+
+def run_background(api: httpx.Client, files: List[Path], timeout: float) -> Dict:
+    """Upload files with background=true and wait for all of their jobs to finish."""
+    start = time.monotonic()
+    response = api.post(
+        "/papers/upload/", params={"background": "true"},
+        files=[("files", (path.name, path.read_bytes(), "application/pdf")) for path in files]
+    )
+    response.raise_for_status()
+    pending = {job["job_id"] for job in response.json() if job.get("job_id")}
+    jobs = []
+    while pending:
+        if time.monotonic() - start > timeout:
+            raise RuntimeError(f"{len(pending)} jobs did not finish within {timeout}s")
+        time.sleep(0.2)
+        for job_id in list(pending):
+            job = api.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("done", "failed"):
+                pending.discard(job_id)
+                jobs.append(job)
+    return {"seconds": time.monotonic() - start, "jobs": jobs}
+
+
+def run_sync(api: httpx.Client, files: List[Path]) -> Dict:
+    """Upload files in one synchronous request."""
+    start = time.monotonic()
+    response = api.post(
+        "/papers/upload/",
+        files=[("files", (path.name, path.read_bytes(), "application/pdf")) for path in files]
+    )
+    response.raise_for_status()
+    return {"seconds": time.monotonic() - start, "results": response.json()}
+
+
+def report(result: Dict, files: List[Path], peak_kb: int, llm: Dict, stub: Dict) -> None:
+    minutes = result["seconds"] / 60
+    print(f"Papers:          {len(files)}")
+    print(f"Wall time:       {result['seconds']:.2f}s")
+    print(f"Throughput:      {len(files) / minutes:.1f} papers/min")
+    if "jobs" in result:
+        failed = [job for job in result["jobs"] if job["status"] == "failed"]
+        print(f"Failed jobs:     {len(failed)}")
+        for job in failed:
+            print(f"  {job['filename']}: {job.get('message')}")
+        print(f"{'Stage':<10} {'n':>4} {'p50 (s)':>9} {'p99 (s)':>9}")
+        for stage, durations in stage_durations(result["jobs"]).items():
+            if durations:
+                print(f"{stage:<10} {len(durations):>4} {percentile(durations, 50):>9.3f} {percentile(durations, 99):>9.3f}")
+    else:
+        failed = [paper for paper in result["results"] if not paper["paper_id"]]
+        print(f"Failed uploads:  {len(failed)}")
+        for paper in failed:
+            print(f"  {paper['title']}: {paper['message']}")
+        print("Stage timings:   not available for synchronous uploads, run with --mode background")
+    print(f"Peak RSS:        {peak_kb / 1024:.1f} MiB (API process and extraction workers)")
+    print(f"LLM calls:       {llm.get('calls')} ({llm.get('retries')} retries, {llm.get('throttled')} throttled)")
+    print(f"Stand-in:        {stub.get('requests')} requests, {stub.get('rate_limited')} answered with 429")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark paper ingestion against a local OpenAI stand-in")
+    parser.add_argument("--papers", default="sample_papers", help="directory of PDFs to upload")
+    parser.add_argument("--mode", choices=["background", "sync"], default="background",
+                        help="upload with background=true and poll the jobs, or in one synchronous request")
+    parser.add_argument("--api-port", type=int, default=8010)
+    parser.add_argument("--stub-port", type=int, default=8011)
+    parser.add_argument("--stub-latency", type=float, default=1.0, help="seconds added to every LLM response")
+    parser.add_argument("--stub-latency-per-1k-tokens", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of LLM calls answered with a 429")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds to wait for all jobs")
+    args = parser.parse_args()
+
+    files = sorted(Path(args.papers).glob("*.pdf"))
+    if not files:
+        sys.exit(f"No PDFs found in {args.papers}")
+
+    database = f"ingest_benchmark_{uuid.uuid4().hex[:8]}"
+    stub_env = {
+        **os.environ,
+        "STUB_LATENCY": str(args.stub_latency),
+        "STUB_LATENCY_PER_1K_TOKENS": str(args.stub_latency_per_1k_tokens),
+        "STUB_RATE_LIMIT_RATE": str(args.rate_limit_rate),
+    }
+    api_env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "benchmark"),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+        "MONGODB_DB": database,
+        "ANALYSIS_CACHE_BACKEND": "none",
+    }
+
+    stub = start_server("benchmarks.openai_stub:app", args.stub_port, stub_env)
+    server = start_server("src.api.app:app", args.api_port, api_env)
+    try:
+        wait_until_up(f"http://127.0.0.1:{args.stub_port}/stats")
+        wait_until_up(f"http://127.0.0.1:{args.api_port}/health")
+        sampler = MemorySampler(server.pid)
+        sampler.start()
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.api_port}", timeout=args.timeout) as api:
+            if args.mode == "background":
+                result = run_background(api, files, args.timeout)
+            else:
+                result = run_sync(api, files)
+            peak_kb = sampler.stop()
+            llm = api.get("/llm/stats").json()
+        stub_stats = httpx.get(f"http://127.0.0.1:{args.stub_port}/stats").json()
+        report(result, files, peak_kb, llm, stub_stats)
+    finally:
+        for process in (server, stub):
+            process.send_signal(signal.SIGINT)
+        for process in (server, stub):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        MongoClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017")).drop_database(database)
+
+
+if __name__ == "__main__":
+    main()
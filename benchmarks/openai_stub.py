@@ -0,0 +1,145 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint, for measuring ingestion offline.
+
+Answers every prompt OpenAIClient sends with a deterministic, schema-valid response derived
+from a hash of the request, so runs are reproducible and cost nothing. Run it with
+
+    uvicorn benchmarks.openai_stub:app --port 8001
+
+and point the API at it with OPENAI_BASE_URL=http://localhost:8001/v1.
+
+Configured through the environment:
+    STUB_LATENCY                 seconds added to every response (default 1.0)
+    STUB_LATENCY_PER_1K_TOKENS   seconds added per 1000 prompt tokens (default 0.05)
+    STUB_RATE_LIMIT_RATE         share of requests answered with a 429 (default 0)
+    STUB_SEED                    seed of the 429 injection (default 0)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from src.ai.prompts import (
+    ANALYSIS_SYSTEM_PROMPT, CHUNK_SYSTEM_PROMPT, CONDITIONS_SYSTEM_PROMPT,
+    PROFILE_SYSTEM_PROMPT, SUMMARY_SYSTEM_PROMPT
+)
+from src.models.profile import (
+    Sex, Race, Continent, Athleticism, Diet,
+    PreexistingCondition, PriorCondition, Surgery, Medication
+)
+
+LATENCY = float(os.getenv("STUB_LATENCY", "1.0"))
+LATENCY_PER_1K_TOKENS = float(os.getenv("STUB_LATENCY_PER_1K_TOKENS", "0.05"))
+RATE_LIMIT_RATE = float(os.getenv("STUB_RATE_LIMIT_RATE", "0"))
+
+app = FastAPI(title="OpenAI stand-in")
+injector = random.Random(int(os.getenv("STUB_SEED", "0")))
+stats = {"requests": 0, "rate_limited": 0}
+
+
+def _pick(rng: random.Random, enum, count: int) -> List[str]:
+    return rng.sample([member.value for member in enum], count)
+
+
+def ideal_profile(seed: str) -> Dict:
+    """A valid ideal profile chosen deterministically from seed."""
+    rng = random.Random(seed)
+    low_age = rng.randrange(18, 60)
+    return {
+        "physical": {
+            "age": [low_age, low_age + rng.randrange(10, 40)],
+            "weight": [] if rng.random() < 0.5 else [100, 250],
+            "sex": rng.choice(["", *[sex.value for sex in Sex]]),
+            "height": [],
+        },
+        "demographics": {
+            "race": rng.choice(["", rng.choice(list(Race)).value]),
+            "location": rng.choice(["", rng.choice(list(Continent)).value]),
+        },
+        "medical_history": {
+            "preexisting_conditions": _pick(rng, PreexistingCondition, rng.randrange(0, 3)),
+            "prior_conditions": _pick(rng, PriorCondition, rng.randrange(0, 2)),
+            "surgeries": _pick(rng, Surgery, rng.randrange(0, 2)),
+            "active_medications": _pick(rng, Medication, rng.randrange(0, 3)),
+        },
+        "lifestyle": {
+            "athleticism": rng.choice(["", rng.choice(list(Athleticism)).value]),
+            "diet": rng.choice(["", rng.choice(list(Diet)).value]),
+        },
+    }
+
+
+def conditions(seed: str) -> str:
+    rng = random.Random(seed)
+    return rng.choice([
+        "age",
+        "age AND (preexisting_conditions OR active_medications)",
+        "(age OR sex) AND (athleticism OR diet)",
+        "preexisting_conditions OR prior_conditions",
+    ])
+
+
+def summary(seed: str) -> str:
+    return f"Stand-in summary {seed[:12]}. The study reports outcomes relevant to the described population."
+
+
+def answer(messages: List[Dict]) -> str:
+    """The content of the response to a conversation, based on the prompt of its first message."""
+    system = messages[0]["content"]
+    seed = hashlib.sha256(json.dumps(messages).encode("utf-8")).hexdigest()
+    if system == ANALYSIS_SYSTEM_PROMPT:
+        return json.dumps({"ideal_profile": ideal_profile(seed), "conditions": conditions(seed)})
+    if system == CHUNK_SYSTEM_PROMPT:
+        return json.dumps({"ideal_profile": ideal_profile(seed), "notes": summary(seed)})
+    if system == PROFILE_SYSTEM_PROMPT and len(messages) == 2:
+        return json.dumps(ideal_profile(seed))
+    if system == SUMMARY_SYSTEM_PROMPT or messages[-2]["content"] == SUMMARY_SYSTEM_PROMPT:
+        return summary(seed)
+    if system == CONDITIONS_SYSTEM_PROMPT or messages[-2]["content"] == CONDITIONS_SYSTEM_PROMPT:
+        return conditions(seed)
+    return summary(seed)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if injector.random() < RATE_LIMIT_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": "1"},
+            content={"error": {"message": "Rate limit reached (stand-in)", "type": "requests", "code": "rate_limit_exceeded"}}
+        )
+
+    prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+    await asyncio.sleep(LATENCY + LATENCY_PER_1K_TOKENS * prompt_tokens / 1000)
+    content = answer(body["messages"])
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-stub-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
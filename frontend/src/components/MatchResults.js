@@ -1,7 +1,6 @@
 import React, { useState } from 'react';
 import { Box, Card, CardContent, Typography, Button, Snackbar, Alert } from '@mui/material';
 import PictureAsPdfIcon from '@mui/icons-material/PictureAsPdf';
-import axios from 'axios';
 import PdfViewer from './PdfViewer';
 
 const MatchResults = ({ matches }) => {
@@ -9,24 +8,9 @@ const MatchResults = ({ matches }) => {
   const [pdfDialogOpen, setPdfDialogOpen] = useState(false);
   const [error, setError] = useState(null);
 
-  const handleViewPdf = async (paperId) => {
-    try {
-      console.log('Fetching PDF for paper:', paperId);
-      const response = await axios.get(`http://localhost:8000/papers/${paperId}/view`);
-      console.log('PDF response:', response.data);
-      
-      if (response.data && response.data.pdf_content) {
-        console.log('PDF content length:', response.data.pdf_content.length);
-        setSelectedPdf(response.data.pdf_content);
-        setPdfDialogOpen(true);
-      } else {
-        console.error('Invalid PDF response:', response.data);
-        throw new Error('Invalid PDF data received');
-      }
-    } catch (error) {
-      console.error('Error loading PDF:', error);
-      setError('Failed to load PDF. Please try again.');
-    }
+  const handleViewPdf = (match) => {
+    setSelectedPdf(`http://localhost:8000${match.download_url}`);
+    setPdfDialogOpen(true);
   };
 
   const handleCloseError = () => {
@@ -46,7 +30,7 @@ const MatchResults = ({ matches }) => {
             </Typography>
             <Button
               startIcon={<PictureAsPdfIcon />}
-              onClick={() => handleViewPdf(match.paper_id)}
+              onClick={() => handleViewPdf(match)}
               variant="outlined"
               size="small"
             >
@@ -57,7 +41,7 @@ const MatchResults = ({ matches }) => {
       ))}
 
       <PdfViewer
-        pdfContent={selectedPdf}
+        pdfUrl={selectedPdf}
         open={pdfDialogOpen}
         onClose={() => {
           setPdfDialogOpen(false);
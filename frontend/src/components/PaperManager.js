@@ -28,16 +28,20 @@ const API_BASE_URL = 'http://localhost:8000';
 
 const PaperManager = () => {
   const [papers, setPapers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [error, setError] = useState('');
   const [deleteDialogOpen, setDeleteDialogOpen] = useState(false);
   const [selectedPaper, setSelectedPaper] = useState(null);
   const [viewDialogOpen, setViewDialogOpen] = useState(false);
-  const [pdfContent, setPdfContent] = useState(null);
+  const [pdfUrl, setPdfUrl] = useState(null);
 
-  const fetchPapers = async () => {
+  const fetchPapers = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/papers`);
-      setPapers(response.data);
+      const response = await axios.get(`${API_BASE_URL}/papers`, {
+        params: cursor ? { cursor } : {}
+      });
+      setPapers((previous) => cursor ? [...previous, ...response.data.papers] : response.data.papers);
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       setError('Failed to load papers');
     }
@@ -65,9 +69,9 @@ const PaperManager = () => {
 
   const viewPaper = async (paper) => {
     try {
-      setSelectedPaper(paper);
-      const response = await axios.get(`${API_BASE_URL}/papers/${paper._id}/view`);
-      setPdfContent(response.data.pdf_content);
+      const detail = await axios.get(`${API_BASE_URL}/papers/${paper._id}`);
+      setSelectedPaper(detail.data);
+      setPdfUrl(`${API_BASE_URL}/papers/${paper._id}/download`);
       setViewDialogOpen(true);
     } catch (err) {
       setError('Failed to load PDF');
@@ -127,6 +131,13 @@ const PaperManager = () => {
               </TableBody>
             </Table>
           </TableContainer>
+          {nextCursor && (
+            <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+              <Button onClick={() => fetchPapers(nextCursor)}>
+                Load more
+              </Button>
+            </Box>
+          )}
         </CardContent>
       </Card>
 
@@ -152,7 +163,7 @@ const PaperManager = () => {
         open={viewDialogOpen}
         onClose={() => {
           setViewDialogOpen(false);
-          setPdfContent(null);
+          setPdfUrl(null);
           setSelectedPaper(null);
         }}
         maxWidth="lg"
@@ -205,7 +216,7 @@ const PaperManager = () => {
                 </pre>
               </Box>
 
-              {pdfContent && (
+              {pdfUrl && (
                 <Box>
                   <Typography variant="h6" gutterBottom>
                     PDF Document
@@ -216,7 +227,7 @@ const PaperManager = () => {
                     marginBottom: '20px'
                   }}>
                     <iframe
-                      src={`data:application/pdf;base64,${pdfContent}`}
+                      src={pdfUrl}
                       width="100%"
                       height="100%"
                       title="PDF Viewer"
@@ -231,7 +242,7 @@ const PaperManager = () => {
         <DialogActions>
           <Button onClick={() => {
             setViewDialogOpen(false);
-            setPdfContent(null);
+            setPdfUrl(null);
             setSelectedPaper(null);
           }}>
             Close
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def stage_key(text_hash: str, model: str, stage: str, prompt: str, upstream: List[str]) -> str:
+    """
+    Cache key of one analysis stage: the paper's normalized text hash, the model, the stage,
+    a hash of the prompt it sends, and the outputs of the earlier stages it builds on.
+    Editing a prompt changes the key of its stage, and of later stages only through
+    the outputs that actually change.
+    """
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    payload = json.dumps([text_hash, model, stage, prompt_hash, upstream])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """Cache of analysis stage outputs. Subclasses provide the storage."""
+
+    backend = "none"
+    # Whether the storage does blocking I/O, which async callers must keep off the event loop
+    blocking = False
+
+    def __init__(self, max_size: int = 10000, max_age: Optional[float] = None):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """get() for the event loop: blocking storage is read in a thread."""
+        if not self.blocking:
+            return self.get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def set_async(self, key: str, value: str) -> None:
+        """set() for the event loop: blocking storage is written in a thread."""
+        if not self.blocking:
+            return self.set(key, value)
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, value)
+
+    async def stats_async(self) -> Dict:
+        """stats() for the event loop: blocking storage is counted in a thread."""
+        if not self.blocking:
+            return self.stats()
+        return await asyncio.get_running_loop().run_in_executor(None, self.stats)
+
+    def __len__(self) -> int:
+        return 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "size": len(self),
+            "max_size": self.max_size,
+            "max_age": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _get(self, key: str) -> Optional[str]:
+        return None
+
+    def _set(self, key: str, value: str) -> None:
+        pass
+
+
+class SQLiteAnalysisCache(AnalysisCache):
+    """
+    Stage outputs in a local SQLite file, kept across restarts and shared by every worker
+    on the machine. Entries older than max_age seconds are dropped, and the least recently
+    used ones beyond max_size.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_size: int = 10000, max_age: Optional[float] = None):
+        super().__init__(max_size, max_age)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS analysis_cache_accessed ON analysis_cache (accessed)")
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, created FROM analysis_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age is not None and now - row[1] > self.max_age:
+                self._connection.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                return None
+            self._connection.execute("UPDATE analysis_cache SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if self.max_age is not None:
+                self._connection.execute("DELETE FROM analysis_cache WHERE created < ?", (now - self.max_age,))
+            self._connection.execute(
+                "DELETE FROM analysis_cache WHERE key IN "
+                "(SELECT key FROM analysis_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+
+def create_analysis_cache() -> AnalysisCache:
+    """
+    Build the analysis cache configured through the environment: ANALYSIS_CACHE_BACKEND
+    (sqlite or none), ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_SIZE and ANALYSIS_CACHE_MAX_AGE
+    (days, 0 for no limit).
+    """
+    backend = os.getenv("ANALYSIS_CACHE_BACKEND", "sqlite")
+    max_size = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+    max_age = float(os.getenv("ANALYSIS_CACHE_MAX_AGE", "90")) * 86400 or None
+    if backend == "none":
+        return AnalysisCache(max_size, max_age)
+    return SQLiteAnalysisCache(os.getenv("ANALYSIS_CACHE_PATH", "data/analysis_cache.sqlite3"), max_size, max_age)
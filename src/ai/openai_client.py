@@ -1,75 +1,294 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from typing import Dict, List, Optional
-from openai import AsyncOpenAI
+from typing import Callable, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, RateLimitError, APIConnectionError, InternalServerError
 from pathlib import Path
+import asyncio
+import httpx
 import json
 import os
-from .prompts import PROFILE_SYSTEM_PROMPT, SUMMARY_SYSTEM_PROMPT, CONDITIONS_SYSTEM_PROMPT
+import random
+from .prompts import PROFILE_SYSTEM_PROMPT, SUMMARY_SYSTEM_PROMPT, CONDITIONS_SYSTEM_PROMPT, ANALYSIS_SYSTEM_PROMPT, CHUNK_SYSTEM_PROMPT
+from .analysis_cache import AnalysisCache, stage_key
+from .rate_limiter import RateLimiter
+from .text_reduction import default_token_budget, estimate_tokens, reduce_paper_text, chunk_text
+from src.core.paper_processor import text_hash
+
+CONDITIONS_REQUEST = "Based on the same paper and the ideal profile you provided, determine the relevancy conditions."
+
+# Tokens reserved for each response until the provider reports what a call used
+EXPECTED_COMPLETION_TOKENS = 1000
+
+# Errors worth retrying: rate limits, dropped connections, timeouts and server errors
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+def _parse_analysis(content: str) -> Tuple[Dict, str]:
+    """The ideal profile and conditions of a structured analysis response. Raises ValueError if either is missing."""
+    analysis = json.loads(content)
+    if not isinstance(analysis, dict):
+        raise ValueError("Analysis response is not a JSON object")
+    profile, conditions = analysis.get("ideal_profile"), analysis.get("conditions")
+    if not isinstance(profile, dict) or not isinstance(conditions, str) or not conditions.strip():
+        raise ValueError("Analysis response is missing the ideal profile or the conditions")
+    return profile, conditions
+
+def _parse_chunk(content: str) -> Tuple[Dict, str]:
+    """The ideal profile and notes of a paper part's analysis response. Raises ValueError if the profile is missing."""
+    analysis = json.loads(content)
+    if not isinstance(analysis, dict) or not isinstance(analysis.get("ideal_profile"), dict):
+        raise ValueError("Part analysis response is missing the ideal profile")
+    notes = analysis.get("notes")
+    return analysis["ideal_profile"], notes if isinstance(notes, str) else ""
+
+def _merge_values(values: List):
+    if all(isinstance(value, dict) for value in values):
+        return merge_profiles(values)
+    if all(isinstance(value, list) for value in values):
+        filled = [value for value in values if value]
+        if filled and all(len(value) == 2 and all(isinstance(bound, (int, float)) for bound in value) for value in filled):
+            return [min(value[0] for value in filled), max(value[1] for value in filled)]
+        return list(dict.fromkeys(item for value in filled for item in value if isinstance(item, str)))
+    distinct = {value for value in values if isinstance(value, str) and value}
+    return distinct.pop() if len(distinct) == 1 else ""
+
+def merge_profiles(profiles: List[Dict]) -> Dict:
+    """
+    Combine the ideal profiles built from the parts of one paper. Ranges are widened to
+    cover every part, lists are joined, and a single value is kept only if no two parts
+    disagree on it.
+    """
+    keys = dict.fromkeys(key for profile in profiles for key in profile)
+    return {key: _merge_values([profile[key] for profile in profiles if key in profile]) for key in keys}
 
 class OpenAIClient:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize OpenAI client with API key from environment or parameter."""
+    def __init__(self, api_key: Optional[str] = None, cache: Optional[AnalysisCache] = None, model: str = "gpt-4o",
+                 token_budget: Optional[int] = None, limiter: Optional[RateLimiter] = None,
+                 max_retries: Optional[int] = None, base_url: Optional[str] = None):
+        """
+        Initialize OpenAI client with API key from environment or parameter.
+        Stage outputs are looked up in and saved to cache, if given. Papers longer than
+        token_budget tokens (ANALYSIS_TOKEN_BUDGET by default) are analyzed in parts.
+
+        One client is meant to be shared by the whole application: its connection pool holds
+        up to OPENAI_MAX_CONNECTIONS connections, its limiter keeps calls within the RPM and
+        TPM limits, and failed calls are retried up to max_retries (OPENAI_MAX_RETRIES) times
+        with jittered exponential backoff. Calls go to base_url (OPENAI_BASE_URL) if given,
+        e.g. a local stand-in of the API for benchmarks.
+        """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable or pass as parameter.")
         
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            max_retries=0,
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+            )
+        )
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.model = model
+        self.token_budget = token_budget or default_token_budget()
 
-    async def analyze_paper(self, paper_text: str) -> Dict:
+    async def _create(self, stage: str, messages: List[Dict], **kwargs):
+        """Make one chat completion call within the rate limits, retrying retryable errors."""
+        estimated = estimate_tokens("".join(message["content"] for message in messages)) + EXPECTED_COMPLETION_TOKENS
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated)
+            try:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    **kwargs
+                )
+            except RETRYABLE_ERRORS as e:
+                # Failed calls don't count against the token limit
+                self.limiter.record_usage(estimated, 0)
+                if isinstance(e, RateLimitError):
+                    self.limiter.rate_limited += 1
+                if attempt == self.max_retries:
+                    self.limiter.failures += 1
+                    raise
+                delay = min(2 ** attempt, 60) * random.uniform(0.5, 1.5)
+                retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                self.limiter.retries += 1
+                print(f"Retrying {stage} call in {delay:.1f}s after {type(e).__name__}")
+                await asyncio.sleep(delay)
+                continue
+            self.limiter.record_usage(estimated, response.usage.total_tokens if response.usage else estimated)
+            return response
+
+    async def _complete(self, stage: str, messages: List[Dict], key: str,
+                        parse: Optional[Callable[[str], object]] = None, **kwargs) -> str:
         """
-        Analyze paper text to extract ideal reader profile, conditions, and generate summary.
+        Run one analysis stage, or return its cached output.
+        Outputs that fail parse are raised instead of cached.
+        """
+        cached = await self.cache.get_async(key)
+        if cached is not None:
+            return cached
+        
+        response = await self._create(stage, messages, **kwargs)
+        content = response.choices[0].message.content
+        if parse is not None:
+            try:
+                parse(content)
+            except Exception as e:
+                print(f"Error parsing {stage} output: {e}")
+                print(f"Raw content: {content}")
+                raise
+        await self.cache.set_async(key, content)
+        return content
+
+    async def _profile_and_conditions(self, paper_text: str, paper_hash: str) -> Tuple[Dict, str]:
+        """
+        Get the ideal profile and the conditions from one structured response, falling back
+        to asking for them one after the other if the response doesn't have both.
         """
         try:
-            # Initialize chat for profile analysis
-            messages = [
-                {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
+            content = await self._complete(
+                "analysis",
+                [
+                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Paper text:\n\n{paper_text}"}
+                ],
+                stage_key(paper_hash, self.model, "analysis", ANALYSIS_SYSTEM_PROMPT, []),
+                parse=_parse_analysis,
+                response_format={"type": "json_object"}
+            )
+            return _parse_analysis(content)
+        except ValueError:
+            print("Falling back to separate profile and conditions calls")
+        
+        messages = [
+            {"role": "system", "content": PROFILE_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Paper text:\n\n{paper_text}"}
+        ]
+        profile_content = await self._complete(
+            "profile",
+            messages,
+            stage_key(paper_hash, self.model, "profile", PROFILE_SYSTEM_PROMPT, []),
+            parse=json.loads,
+            response_format={"type": "json_object"}
+        )
+        
+        messages.extend([
+            {"role": "assistant", "content": profile_content},
+            {"role": "system", "content": CONDITIONS_SYSTEM_PROMPT},
+            {"role": "user", "content": CONDITIONS_REQUEST}
+        ])
+        conditions_text = await self._complete(
+            "conditions",
+            messages,
+            stage_key(paper_hash, self.model, "conditions", CONDITIONS_SYSTEM_PROMPT + CONDITIONS_REQUEST,
+                      [profile_content])
+        )
+        return json.loads(profile_content), conditions_text
+
+    async def _summary(self, paper_text: str, paper_hash: str) -> str:
+        return await self._complete(
+            "summary",
+            [
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
                 {"role": "user", "content": f"Paper text:\n\n{paper_text}"}
-            ]
-            
-            # First call: Get ideal profile
-            profile_response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
+            ],
+            stage_key(paper_hash, self.model, "summary", SUMMARY_SYSTEM_PROMPT, [])
+        )
+
+    async def _analyze_chunk(self, chunk: str, part: int, parts: int) -> Optional[Tuple[Dict, str]]:
+        """The ideal profile and notes of one part of a paper, or None if the response is malformed."""
+        try:
+            content = await self._complete(
+                "chunk",
+                [
+                    {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Paper text, part {part} of {parts}:\n\n{chunk}"}
+                ],
+                stage_key(text_hash(chunk), self.model, "chunk", CHUNK_SYSTEM_PROMPT, []),
+                parse=_parse_chunk,
                 response_format={"type": "json_object"}
             )
-            
-            try:
-                profile_data = json.loads(profile_response.choices[0].message.content)
-            except json.JSONDecodeError as e:
-                print(f"Error decoding profile JSON: {e}")
-                print(f"Raw content: {profile_response.choices[0].message.content}")
-                raise
-            
-            # Second call: Get conditions
-            messages.extend([
-                {"role": "assistant", "content": profile_response.choices[0].message.content},
-                {"role": "system", "content": CONDITIONS_SYSTEM_PROMPT},
-                {"role": "user", "content": "Based on the same paper and the ideal profile you provided, determine the relevancy conditions."}
-            ])
-            
-            conditions_response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages
+        except ValueError:
+            return None
+        return _parse_chunk(content)
+
+    async def _map_reduce(self, paper_text: str, paper_hash: str) -> Dict:
+        """
+        Analyze a paper too long for one call: each part yields an ideal profile and notes,
+        the profiles are merged, and the conditions and summary are written from the notes.
+        """
+        chunks = chunk_text(paper_text, self.token_budget)
+        print(f"Analyzing paper in {len(chunks)} parts")
+        results = [
+            result for result in await asyncio.gather(*(
+                self._analyze_chunk(chunk, part, len(chunks)) for part, chunk in enumerate(chunks, 1)
+            ))
+            if result is not None
+        ]
+        if not results:
+            raise ValueError("No part of the paper could be analyzed")
+        
+        profile_data = merge_profiles([profile for profile, _ in results])
+        profile_content = json.dumps(profile_data)
+        notes = "\n\n".join(f"Part {part}: {part_notes}" for part, (_, part_notes) in enumerate(results, 1) if part_notes)
+        
+        conditions_text, summary = await asyncio.gather(
+            self._complete(
+                "reduce_conditions",
+                [
+                    {"role": "system", "content": CONDITIONS_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Notes on each part of the paper:\n\n{notes}\n\nIdeal profile:\n\n{profile_content}"}
+                ],
+                stage_key(paper_hash, self.model, "reduce_conditions", CONDITIONS_SYSTEM_PROMPT, [notes, profile_content])
+            ),
+            self._complete(
+                "reduce_summary",
+                [
+                    {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"Notes on each part of the paper:\n\n{notes}"}
+                ],
+                stage_key(paper_hash, self.model, "reduce_summary", SUMMARY_SYSTEM_PROMPT, [notes])
             )
+        )
+        
+        return {
+            "ideal_profile": profile_data,
+            "conditions": conditions_text,
+            "summary": summary
+        }
+
+    async def analyze_paper(self, paper_text: str) -> Dict:
+        """
+        Analyze paper text to extract ideal reader profile, conditions, and generate summary.
+
+        The text is first cut down to its matching-relevant sections. The profile and conditions
+        then come from one structured call, made at the same time as the summary call, so the
+        paper text is sent twice and the analysis takes as long as the slower of the two.
+        Papers still over the token budget are analyzed in parts and the results merged.
+        Each stage is cached by the paper's text, the model and its prompt.
+        """
+        try:
+            paper_text = reduce_paper_text(paper_text, self.token_budget)
+            paper_hash = text_hash(paper_text)
+            if estimate_tokens(paper_text) > self.token_budget:
+                return await self._map_reduce(paper_text, paper_hash)
             
-            conditions_text = conditions_response.choices[0].message.content
-            
-            # Third call: Get summary
-            messages.extend([
-                {"role": "assistant", "content": conditions_response.choices[0].message.content},
-                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
-                {"role": "user", "content": "Based on the same paper, provide a summary."}
-            ])
-            
-            summary_response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages
+            (profile_data, conditions_text), summary = await asyncio.gather(
+                self._profile_and_conditions(paper_text, paper_hash),
+                self._summary(paper_text, paper_hash)
             )
             
-            summary = summary_response.choices[0].message.content
-            
             return {
                 "ideal_profile": profile_data,
                 "conditions": conditions_text,
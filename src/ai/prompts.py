@@ -169,4 +169,39 @@ In constructing the condition, try to understand what would be the MOST importan
 If you are unsure, tend towards a wider scope. That is, create conditions tat are more widely encompassing, even if some may not be directly assessed in the study, because the medical knowledge is probably still useful.
 
 IMPORTANT: Return ONLY the string, and nothing else.
-"""
\ No newline at end of file
+"""
+
+ANALYSIS_SYSTEM_PROMPT = f"""
+You will be provided with a medical paper. Read and analyze it carefully. You have two tasks, described below.
+Return the results of both in a single JSON object with exactly these keys:
+{{
+  "ideal_profile": <the JSON object from TASK 1>,
+  "conditions": "<the string from TASK 2>"
+}}
+
+TASK 1: IDEAL PROFILE
+{PROFILE_SYSTEM_PROMPT}
+
+TASK 2: RELEVANCY CONDITIONS
+{CONDITIONS_SYSTEM_PROMPT}
+
+IMPORTANT: The instructions above to return only the profile or only the string apply to the values of the two keys.
+Return ONLY the JSON object with the "ideal_profile" and "conditions" keys, and nothing else.
+"""
+
+
+CHUNK_SYSTEM_PROMPT = f"""
+You will be provided with one part of a longer medical paper. The other parts are analyzed separately, and the results are combined.
+Return a single JSON object with exactly these keys:
+{{
+  "ideal_profile": <the ideal reader profile described below, based only on this part>,
+  "notes": "<under 150 words on the study population, interventions and findings in this part, or an empty string if it has none>"
+}}
+
+IDEAL PROFILE
+{PROFILE_SYSTEM_PROMPT}
+
+IMPORTANT: The instruction above to return only the profile applies to the value of the "ideal_profile" key.
+Leave a characteristic empty if this part says nothing about it.
+Return ONLY the JSON object with the "ideal_profile" and "notes" keys, and nothing else.
+"""
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Bucket refilled continuously up to capacity, at capacity units per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount units are available."""
+        return max(amount - self.level, 0) * 60 / self.capacity
+
+
+class RateLimiter:
+    """
+    Admits LLM calls within a requests-per-minute and a tokens-per-minute limit.
+
+    Each call reserves its estimated token cost before it is made, and the estimate is
+    corrected by the usage the provider reports. Calls are admitted in arrival order.
+    Configured through OPENAI_RPM and OPENAI_TPM.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm or int(os.getenv("OPENAI_RPM", "500"))
+        self.tpm = tpm or int(os.getenv("OPENAI_TPM", "30000"))
+        self.requests = TokenBucket(self.rpm)
+        self.tokens = TokenBucket(self.tpm)
+        self._lock = asyncio.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.tokens_used = 0
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait until a call costing about tokens tokens fits the limits. Returns the seconds waited."""
+        tokens = min(tokens, self.tpm)
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                self.requests.refill()
+                self.tokens.refill()
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+        waited = time.monotonic() - start
+        self.calls += 1
+        self.wait_seconds += waited
+        if waited > 0.01:
+            self.throttled += 1
+        return waited
+
+    def record_usage(self, estimated: int, used: int) -> None:
+        """Correct the tokens reserved for a call by what it actually used."""
+        self.tokens.level += min(estimated, self.tpm) - used
+        self.tokens_used += used
+
+    def stats(self) -> Dict:
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "tokens_used": self.tokens_used,
+        }
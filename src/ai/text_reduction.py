@@ -0,0 +1,107 @@
+import os
+import re
+from typing import List, Tuple
+
+# Rough number of characters per token of English text
+CHARS_PER_TOKEN = 4
+
+# Section names and the headings that start them, checked in order
+SECTION_HEADINGS = [
+    ("abstract", r"abstract|summary"),
+    ("introduction", r"introduction|background"),
+    ("participants", r"(?:study )?participants|patients|(?:study )?population|subjects"),
+    ("methods", r"(?:(?:materials|patients|subjects) and )?methods?|methodology|(?:study|experimental) design"),
+    ("results", r"results(?: and discussion)?|findings"),
+    ("discussion", r"discussion"),
+    ("conclusion", r"conclusions?|concluding remarks"),
+    ("references", r"references|bibliography|literature cited"),
+    ("acknowledgements", r"acknowledge?ments?"),
+    ("funding", r"funding(?: sources?)?|financial support"),
+    ("disclosures", r"(?:conflicts? of interest|competing interests?|disclosures?|declarations?)(?: statement)?"),
+    ("contributions", r"(?:author(?:s'?)?|credit authorship) contributions?(?: statement)?"),
+    ("supplementary", r"supplementary (?:materials?|information|data)|appendix|appendices|supporting information"),
+    ("data availability", r"(?:data availability|availability of data and materials)(?: statement)?"),
+    ("abbreviations", r"abbreviations"),
+]
+
+HEADING_PATTERNS = [
+    (name, re.compile(rf"^(?:[IVX]+\.|\d+(?:\.\d+)*\.?)?\s*(?:{pattern})\s*[:.]?$", re.IGNORECASE))
+    for name, pattern in SECTION_HEADINGS
+]
+
+# Sections that never inform the ideal profile, conditions or summary
+BOILERPLATE_SECTIONS = {
+    "references", "acknowledgements", "funding", "disclosures",
+    "contributions", "supplementary", "data availability", "abbreviations",
+}
+
+# Sections dropped, in this order, while a paper is over its token budget
+OPTIONAL_SECTIONS = ["introduction", "discussion"]
+
+# Sections that must be found before optional ones are dropped. Without them, the
+# paper's headings weren't recognized and an "introduction" may hold its whole body.
+CORE_SECTIONS = {"participants", "methods", "results"}
+
+
+def default_token_budget() -> int:
+    """Most tokens of paper text sent in one analysis call, set by ANALYSIS_TOKEN_BUDGET."""
+    return int(os.getenv("ANALYSIS_TOKEN_BUDGET", "24000"))
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """
+    Split extracted paper text into (section name, text) pairs at recognized heading lines.
+    Text before the first heading (title, authors, often the abstract) is named "front".
+    """
+    sections = [("front", [])]
+    for line in text.splitlines():
+        stripped = line.strip()
+        name = None
+        if stripped and len(stripped) <= 60:
+            name = next((name for name, pattern in HEADING_PATTERNS if pattern.match(stripped)), None)
+        if name is not None:
+            sections.append((name, [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(name, "\n".join(lines)) for name, lines in sections if any(line.strip() for line in lines)]
+
+
+def reduce_paper_text(text: str, budget: int) -> str:
+    """
+    Drop boilerplate sections (references, acknowledgements, funding, ...) from a paper's text,
+    then, while it is over budget tokens, its introduction and discussion. The abstract,
+    participants, methods, results and conclusion are always kept, and optional sections
+    are only dropped from papers where some of them were found.
+    """
+    sections = [(name, section) for name, section in split_sections(text) if name not in BOILERPLATE_SECTIONS]
+    if not CORE_SECTIONS & {name for name, _ in sections}:
+        return "\n".join(section for _, section in sections).strip()
+    for optional in OPTIONAL_SECTIONS:
+        if estimate_tokens("\n".join(section for _, section in sections)) <= budget:
+            break
+        sections = [(name, section) for name, section in sections if name != optional]
+    return "\n".join(section for _, section in sections).strip()
+
+
+def chunk_text(text: str, budget: int) -> List[str]:
+    """Split text into chunks of at most budget tokens, at line breaks where possible."""
+    limit = budget * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current.strip():
+        chunks.append(current)
+    return chunks
@@ -1,17 +1,34 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .models import ProfileResponse, MatchResponse, PaperMatch, PaperUploadResponse, ErrorResponse, UserProfileResponse, SaveProfileRequest
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from .models import ProfileResponse, MatchResponse, PaperMatch, PaperExplanation, PaperListResponse, PaperUploadResponse, ErrorResponse, UserProfileResponse, SaveProfileRequest, BatchMatchRequest, BatchMatchResponse, IngestJobResponse, IngestJobStatus
 from src.models.profile import CustomerProfile
 from src.core.profile_matcher import ProfileMatcher
-from src.core.paper_processor import PaperProcessor
+from src.core.percolator import ProfilePercolator
+from src.core.match_cache import create_match_cache, profile_hash
+from src.core.paper_processor import PdfExtractor, file_sha256, text_hash
 from src.ai.openai_client import OpenAIClient
+from src.ai.analysis_cache import create_analysis_cache
 from .database import Database
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from .catalog import PaperCatalog, PushdownCatalog
+from .ingest import IngestionQueue
+from .profile_index import SavedProfileIndex
+from .pipeline import IngestionPipeline
+from pymongo.errors import DuplicateKeyError
+from pydantic import ValidationError
+import asyncio
 import uuid
-import tempfile
+from datetime import datetime
 import os
 import base64
-from typing import List
+import hashlib
+import json
+import logging
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Medical Research Relevancy Tool",
@@ -28,201 +45,461 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared matcher so compiled paper conditions are reused across requests
+profile_matcher = ProfileMatcher()
+
+# Matching-relevant fields of every paper, kept in sync with the papers collection.
+# With MATCH_PUSHDOWN=true papers stay in MongoDB, which pre-filters them for each profile.
+MATCH_PUSHDOWN = os.getenv("MATCH_PUSHDOWN", "false").lower() in ("1", "true", "yes")
+catalog = PushdownCatalog(profile_matcher) if MATCH_PUSHDOWN else PaperCatalog(profile_matcher)
+
+# Recent match results, keyed by profile and catalog version
+match_cache = create_match_cache()
+
+# Outputs of each paper analysis stage, keyed by paper text, model and prompt
+analysis_cache = create_analysis_cache()
+
+# OpenAI client shared by all analyses, so they share its connection pool and rate limits
+ai_client: Optional[OpenAIClient] = None
+
+# Fields GET /papers can return, and the ones it returns by default
+PAPER_LIST_FIELDS = ["title", "processed_data.summary", "processed_data.ideal_profile", "processed_data.conditions"]
+DEFAULT_PAPER_FIELDS = ["title", "processed_data.summary"]
+
+# Fields of paper documents only used internally, never returned. match_fields holds
+# infinite bounds, which JSON can't encode.
+INTERNAL_PAPER_FIELDS = ["match_fields", "content_sha256", "text_sha256"]
+
+# Single byte range of a Range header; other forms are answered with the whole file
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Media type of newline-delimited JSON responses
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Number of files of one upload processed at the same time
+UPLOAD_CONCURRENCY = max(int(os.getenv("UPLOAD_CONCURRENCY", "4")), 1)
+
+# Worker processes that extract the text of uploaded PDFs
+pdf_extractor = PdfExtractor()
+
+# Background ingestion jobs for uploads made with background=true
+ingest_queue = IngestionQueue()
+
+# Saved user profiles, indexed to find the users each new paper matches
+percolator = ProfilePercolator()
+profile_index = SavedProfileIndex(percolator)
+
 @app.on_event("startup")
 async def startup_db_client():
     await Database.connect_db()
-    # Initialize GridFS with the correct class
-    app.fs = AsyncIOMotorGridFSBucket(Database.get_db())
+    app.fs = Database.get_fs()
+    await profile_index.sync(force=True)
+    await catalog.backfill_match_fields()
+    await _backfill_paper_hashes()
+    await catalog.ensure_loaded()
+    app.catalog_watcher = asyncio.create_task(catalog.watch(on_tick=profile_index.sync))
+    ingest_queue.start(pipeline.run_job, cleanup=pipeline.discard_job)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.catalog_watcher.cancel()
+    ingest_queue.stop()
+    pdf_extractor.shutdown()
     await Database.close_db()
 
-@app.post("/match/", response_model=MatchResponse)
-async def match_papers(profile: CustomerProfile):
+def _profile_to_dict(profile: CustomerProfile) -> dict:
+    """Convert a profile to a dict with Enum values as strings."""
+    profile_dict = profile.dict()
+    
+    # Convert Enum values in physical
+    profile_dict['physical']['sex'] = profile_dict['physical']['sex'].value
+    
+    # Convert Enum values in demographics
+    profile_dict['demographics']['race'] = profile_dict['demographics']['race'].value
+    profile_dict['demographics']['location'] = profile_dict['demographics']['location'].value
+    
+    # Convert Enum values in medical_history lists
+    profile_dict['medical_history']['preexisting_conditions'] = [
+        condition.value for condition in profile_dict['medical_history']['preexisting_conditions']
+    ]
+    profile_dict['medical_history']['prior_conditions'] = [
+        condition.value for condition in profile_dict['medical_history']['prior_conditions']
+    ]
+    profile_dict['medical_history']['surgeries'] = [
+        surgery.value for surgery in profile_dict['medical_history']['surgeries']
+    ]
+    profile_dict['medical_history']['active_medications'] = [
+        med.value for med in profile_dict['medical_history']['active_medications']
+    ]
+    
+    # Convert Enum values in lifestyle
+    profile_dict['lifestyle']['athleticism'] = profile_dict['lifestyle']['athleticism'].value
+    profile_dict['lifestyle']['diet'] = profile_dict['lifestyle']['diet'].value
+    return profile_dict
+
+def _validated_profile(profile: Union[Dict, CustomerProfile]) -> dict:
+    """
+    Validate a profile given or saved as a plain dict, converting it the same way as
+    profiles sent to /match/. Raises ValidationError if it isn't a valid CustomerProfile.
+    """
+    if not isinstance(profile, CustomerProfile):
+        profile = CustomerProfile.parse_obj(profile)
+    return _profile_to_dict(profile)
+
+def shared_ai_client() -> OpenAIClient:
+    """The OpenAI client shared by every upload and ingestion job, created on first use."""
+    global ai_client
+    if ai_client is None:
+        ai_client = OpenAIClient(cache=analysis_cache)
+    return ai_client
+
+# Extraction, analysis and storage of uploaded papers, shared with the batch ingestion CLI
+pipeline = IngestionPipeline(catalog, percolator, pdf_extractor, shared_ai_client)
+
+def _wants_stream(request: Request, stream: bool) -> bool:
+    """Whether a response should be streamed as NDJSON, by query flag or Accept header."""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _paper_match(papers: Dict[str, dict], paper_id: str, score: float) -> PaperMatch:
+    return PaperMatch(
+        paper_id=paper_id,
+        title=papers[paper_id]['title'],
+        summary=papers[paper_id]['processed_data']['summary'],
+        match_score=score,
+        download_url=f"/papers/{paper_id}/download"
+    )
+
+async def _match_response(profile_id: str, profile_dict: dict,
+                          limit: Optional[int] = None, offset: int = 0) -> MatchResponse:
+    """Match one profile against the catalog, keeping one page of the best matches."""
+    await catalog.ensure_loaded()
+    cache_key = f"{profile_hash(profile_dict)}:{catalog.cache_version}:{limit}:{offset}"
+    cached = await match_cache.get_async(cache_key)
+    if cached is not None:
+        return MatchResponse(profile_id=profile_id, **cached)
+    
+    papers, matcher = await catalog.matcher_for(profile_dict)
+    ranked, total = matcher.rank_catalog(profile_dict, limit=limit, offset=offset)
+    matches = [_paper_match(papers, paper_id, score) for paper_id, score in ranked if paper_id in papers]
+    await match_cache.set_async(cache_key, {"matches": [match.dict() for match in matches], "total_matches": total})
+    return MatchResponse(
+        profile_id=profile_id,
+        matches=matches,
+        total_matches=total
+    )
+
+async def _explain_matches(profile_dict: dict) -> List[PaperExplanation]:
+    """
+    Build the per-paper evaluation traces returned by /match/?explain=true.
+    With MATCH_PUSHDOWN only the candidates MongoDB returned are traced.
+    """
+    papers, matcher = await catalog.matcher_for(profile_dict)
+    explanations = matcher.explain_catalog(profile_dict)
+    return [
+        PaperExplanation(
+            paper_id=paper['_id'],
+            title=paper['title'],
+            conditions=explanations[paper['_id']]["conditions"],
+            matched=explanations[paper['_id']]["trace"]["result"],
+            candidate=explanations[paper['_id']]["candidate"],
+            trace=explanations[paper['_id']]["trace"]
+        )
+        for paper in papers.values() if paper['_id'] in explanations
+    ]
+
+async def _stream_matches(profile_dict: dict, limit: Optional[int], offset: int) -> StreamingResponse:
     """
-    Match a profile against stored papers and return matching results.
+    Stream one page of a profile's matches as NDJSON, one PaperMatch per line, best first.
+    Only the (paper_id, score) ranking is held in memory; total_matches is sent in
+    the X-Total-Matches header.
     """
+    papers, matcher = await catalog.matcher_for(profile_dict)
+    ranked, total = matcher.rank_catalog(profile_dict, limit=limit, offset=offset)
+    
+    async def match_lines():
+        for paper_id, score in ranked:
+            if paper_id in papers:
+                yield _paper_match(papers, paper_id, score).json() + "\n"
+    
+    return StreamingResponse(match_lines(), media_type=NDJSON_MEDIA_TYPE,
+                             headers={"X-Total-Matches": str(total)})
+
+@app.post("/match/", response_model=MatchResponse, response_model_exclude_none=True)
+async def match_papers(profile: CustomerProfile, request: Request, explain: bool = False,
+                       limit: Optional[int] = Query(None, ge=1), offset: int = Query(0, ge=0),
+                       stream: bool = False):
+    """
+    Match a profile against stored papers and return matching results, best first.
+    limit/offset select one page of the matches; total_matches counts all of them.
+    With explain=true the response also carries an evaluation trace for every paper.
+    With stream=true or Accept: application/x-ndjson the matches are streamed instead,
+    one PaperMatch per line, with total_matches in the X-Total-Matches header.
+    """
+    streaming = _wants_stream(request, stream)
+    if streaming and explain:
+        raise HTTPException(status_code=400, detail="explain is not supported for streamed matches")
+    
     try:
-        db = Database.get_db()
-        profile_matcher = ProfileMatcher()
-        
-        # Get all papers from database
-        papers = await db.papers.find().to_list(length=None)
-        matches = []
+        profile_dict = _profile_to_dict(profile)
+        logger.debug("Matching profile %s", profile_dict)
         
-        print(f"Found {len(papers)} papers to check for matches")
+        if streaming:
+            return await _stream_matches(profile_dict, limit, offset)
         
-        # Convert profile to dict and convert Enum values to strings
-        profile_dict = profile.dict()
+        response = await _match_response("temporary", profile_dict, limit=limit, offset=offset)
+        if explain:
+            response.explanations = await _explain_matches(profile_dict)
         
-        # Convert Enum values in physical
-        profile_dict['physical']['sex'] = profile_dict['physical']['sex'].value
-        
-        # Convert Enum values in demographics
-        profile_dict['demographics']['race'] = profile_dict['demographics']['race'].value
-        profile_dict['demographics']['location'] = profile_dict['demographics']['location'].value
+        logger.debug("Total matches found: %d", response.total_matches)
+        return response
         
-        # Convert Enum values in medical_history lists
-        profile_dict['medical_history']['preexisting_conditions'] = [
-            condition.value for condition in profile_dict['medical_history']['preexisting_conditions']
-        ]
-        profile_dict['medical_history']['prior_conditions'] = [
-            condition.value for condition in profile_dict['medical_history']['prior_conditions']
-        ]
-        profile_dict['medical_history']['surgeries'] = [
-            surgery.value for surgery in profile_dict['medical_history']['surgeries']
-        ]
-        profile_dict['medical_history']['active_medications'] = [
-            med.value for med in profile_dict['medical_history']['active_medications']
-        ]
+    except Exception as e:
+        logger.error("Match error: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to process match request: {str(e)}"
+        )
+
+@app.post("/match/batch", response_model=BatchMatchResponse, response_model_exclude_none=True)
+async def match_papers_batch(request: BatchMatchRequest):
+    """
+    Match many profiles against stored papers, loading the catalog once.
+    Profiles are given inline, by saved username, or both. Saved profiles that don't
+    exist or aren't valid are reported per username. With stream=true the
+    results are sent back as newline-delimited JSON, one MatchResponse per line.
+    """
+    try:
+        await catalog.ensure_loaded()
         
-        # Convert Enum values in lifestyle
-        profile_dict['lifestyle']['athleticism'] = profile_dict['lifestyle']['athleticism'].value
-        profile_dict['lifestyle']['diet'] = profile_dict['lifestyle']['diet'].value
+        # Inline profiles are identified by their position in the request
+        profiles = [(str(i), _profile_to_dict(profile)) for i, profile in enumerate(request.profiles)]
+        missing_profiles = []
+        invalid_profiles = []
+        if request.usernames:
+            saved = await Database.get_user_profiles(request.usernames)
+            for username in request.usernames:
+                if username not in saved:
+                    missing_profiles.append(username)
+                    continue
+                try:
+                    profiles.append((username, _validated_profile(saved[username].get("profile"))))
+                except ValidationError as e:
+                    logger.warning("Saved profile %s is invalid: %s", username, e)
+                    invalid_profiles.append(username)
         
-        print(f"Processing profile with characteristics: {profile_dict}")
+        logger.debug("Matching %d profiles", len(profiles))
         
-        for paper in papers:
-            try:
-                print(f"Checking paper: {paper['_id']} - {paper['title']}")
-                
-                paper_data = {
-                    'ideal_profile': paper['processed_data']['ideal_profile'],
-                    'conditions': paper['processed_data']['conditions']
-                }
-                
-                is_match = profile_matcher._is_match(profile_dict, paper_data)
-                print(f"Match result for paper {paper['_id']}: {is_match}")
-                
-                if is_match:
-                    match = PaperMatch(
-                        paper_id=paper['_id'],
-                        title=paper['title'],
-                        summary=paper['processed_data']['summary'],
-                        match_score=1.0,
-                        download_url=f"/papers/{paper['_id']}/download"
-                    )
-                    matches.append(match)
-                    print(f"Added match: {match}")
-            except Exception as e:
-                print(f"Error processing paper {paper.get('_id', 'unknown')}: {str(e)}")
-                continue
+        if request.stream:
+            async def result_lines():
+                for profile_id, profile_dict in profiles:
+                    response = await _match_response(profile_id, profile_dict, request.limit, request.offset)
+                    yield response.json() + "\n"
+                for username in missing_profiles:
+                    yield json.dumps({"profile_id": username, "detail": "Profile not found"}) + "\n"
+                for username in invalid_profiles:
+                    yield json.dumps({"profile_id": username, "detail": "Profile is invalid"}) + "\n"
+            return StreamingResponse(result_lines(), media_type=NDJSON_MEDIA_TYPE)
         
-        print(f"Total matches found: {len(matches)}")
-        response = MatchResponse(
-            profile_id="temporary",
-            matches=matches,
-            total_matches=len(matches)
+        return BatchMatchResponse(
+            results=[
+                await _match_response(profile_id, profile_dict, request.limit, request.offset)
+                for profile_id, profile_dict in profiles
+            ],
+            missing_profiles=missing_profiles,
+            invalid_profiles=invalid_profiles
         )
-        print(f"Returning response with {len(response.matches)} matches")
-        return response
         
     except Exception as e:
-        print(f"Match error: {str(e)}")
+        logger.error("Batch match error: %s", e)
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to process match request: {str(e)}"
+            detail=f"Failed to process batch match request: {str(e)}"
         )
 
-@app.post("/papers/upload/", response_model=List[PaperUploadResponse])
-async def upload_papers(files: List[UploadFile] = File(...)):
+@app.get("/match/cache/stats")
+async def match_cache_stats():
     """
-    Upload and process multiple papers. Stores the papers and their processed data in MongoDB.
+    Report the match result cache's backend, size and hit rate.
     """
-    responses = []
-    
-    for file in files:
-        tmp_path = None
+    return await match_cache.stats_async()
+
+def _duplicate_response(existing: dict, title: str) -> PaperUploadResponse:
+    return PaperUploadResponse(
+        paper_id=existing["_id"],
+        title=title,
+        summary=existing["processed_data"]["summary"],
+        message=f"Duplicate of {existing['title']}",
+        duplicate=True
+    )
+
+async def _backfill_paper_hashes() -> None:
+    """Store the content and text hashes of papers uploaded before duplicates were detected."""
+    db = Database.get_db()
+    filled = 0
+    async for paper in db.papers.find({"content_sha256": {"$exists": False}}, {"_id": 1}):
         try:
-            # Validate file type
-            if not file.filename.endswith('.pdf'):
-                responses.append(PaperUploadResponse(
-                    paper_id="",
-                    title=file.filename,
-                    message=f"Skipped: File must be a PDF"
-                ))
-                continue
-
-            # Read the file content
-            content = await file.read()
-            print(f"Processing file {file.filename}, size: {len(content)} bytes")
-
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(content)
-                tmp_path = tmp_file.name
-
-            # Process the PDF
-            processor = PaperProcessor(papers_dir=os.path.dirname(tmp_path))
-            text = processor.extract_text_from_pdf(os.path.basename(tmp_path))
-            
-            if not text:
-                responses.append(PaperUploadResponse(
-                    paper_id="",
-                    title=file.filename,
-                    message="Failed to extract text from PDF"
-                ))
-                continue
-            
-            # Analyze with OpenAI
-            ai_client = OpenAIClient()
-            try:
-                analysis = await ai_client.analyze_paper(text)
-            except Exception as e:
-                responses.append(PaperUploadResponse(
-                    paper_id="",
-                    title=file.filename,
-                    message=f"OpenAI analysis failed: {str(e)}"
-                ))
-                continue
-            
-            # Generate paper_id and store in GridFS
-            paper_id = str(uuid.uuid4())
-            await app.fs.upload_from_stream(
-                paper_id,
-                content,
-                metadata={"content_type": "application/pdf"}
+            digest = hashlib.sha256()
+            async for chunk in await app.fs.open_download_stream_by_name(paper["_id"]):
+                digest.update(chunk)
+            hashes = {"content_sha256": digest.hexdigest()}
+            stored = await db.paper_contents.find_one({"_id": paper["_id"]})
+            if stored:
+                hashes["text_sha256"] = text_hash(stored["content"])
+            await db.papers.update_one({"_id": paper["_id"]}, {"$set": hashes})
+            filled += 1
+        except DuplicateKeyError:
+            logger.info("Paper %s duplicates another stored paper, leaving it unhashed", paper["_id"])
+        except Exception as e:
+            logger.error("Error hashing paper %s: %s", paper["_id"], e)
+    if filled:
+        logger.info("Stored hashes of %d papers", filled)
+
+async def _process_upload(file: UploadFile) -> PaperUploadResponse:
+    """
+    Extract, analyze and store one uploaded PDF. Failures are reported in the response.
+    A PDF whose bytes or text match a stored paper is answered with that paper instead.
+    """
+    paper_id = None
+    try:
+        # Validate file type
+        if not file.filename.endswith('.pdf'):
+            return PaperUploadResponse(
+                paper_id="",
+                title=file.filename,
+                message=f"Skipped: File must be a PDF"
             )
-            
-            # Store metadata in database
-            paper_data = {
-                "_id": paper_id,
-                "title": file.filename,
-                "content": text,
-                "processed_data": {
-                    "ideal_profile": analysis["ideal_profile"],
-                    "conditions": analysis["conditions"],
-                    "summary": analysis["summary"]
-                }
-            }
-            
-            db = Database.get_db()
-            await db.papers.insert_one(paper_data)
-            
-            responses.append(PaperUploadResponse(
-                paper_id=paper_id,
+
+        logger.info("Processing file %s", file.filename)
+
+        hashes = {"content_sha256": await asyncio.get_running_loop().run_in_executor(None, file_sha256, file.file)}
+        existing = await pipeline.find_duplicate(content_sha256=hashes["content_sha256"])
+        if existing:
+            return _duplicate_response(existing, file.filename)
+
+        # Extract from the spooled upload
+        text = await pdf_extractor.extract(file.file)
+        
+        if not text:
+            return PaperUploadResponse(
+                paper_id="",
                 title=file.filename,
-                summary=analysis["summary"],
-                message="Paper successfully processed"
-            ))
-            
+                message="Failed to extract text from PDF"
+            )
+        
+        hashes["text_sha256"] = text_hash(text)
+        existing = await pipeline.find_duplicate(text_sha256=hashes["text_sha256"])
+        if existing:
+            return _duplicate_response(existing, file.filename)
+        
+        # Generate paper_id and store in GridFS
+        paper_id = str(uuid.uuid4())
+        await pipeline.store_pdf(paper_id, file.file)
+        
+        # Analyze with OpenAI
+        try:
+            analysis = await shared_ai_client().analyze_paper(text)
         except Exception as e:
-            responses.append(PaperUploadResponse(
+            await pipeline.discard_paper(paper_id)
+            return PaperUploadResponse(
                 paper_id="",
                 title=file.filename,
-                message=f"Error processing paper: {str(e)}"
-            ))
-            
-        finally:
-            # Clean up temporary file
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.unlink(tmp_path)
-                except Exception as e:
-                    print(f"Error deleting temporary file: {e}")
+                message=f"OpenAI analysis failed: {str(e)}"
+            )
+        
+        # Store metadata in database, with the extracted text kept apart
+        await Database.get_db().paper_contents.insert_one({"_id": paper_id, "content": text})
+        try:
+            await pipeline.store_paper(paper_id, file.filename, analysis, hashes)
+        except DuplicateKeyError:
+            # The same paper was stored by a concurrent upload
+            await pipeline.discard_paper(paper_id)
+            return _duplicate_response(await pipeline.find_duplicate(**hashes), file.filename)
+        
+        return PaperUploadResponse(
+            paper_id=paper_id,
+            title=file.filename,
+            summary=analysis["summary"],
+            message="Paper successfully processed"
+        )
+        
+    except Exception as e:
+        if paper_id:
+            await pipeline.discard_paper(paper_id)
+        return PaperUploadResponse(
+            paper_id="",
+            title=file.filename,
+            message=f"Error processing paper: {str(e)}"
+        )
+
+async def _enqueue_upload(file: UploadFile) -> IngestJobResponse:
+    """
+    Store one uploaded PDF in GridFS and queue its ingestion.
+    A PDF whose bytes match a stored paper is answered with that paper instead.
+    """
+    if not file.filename.endswith('.pdf'):
+        return IngestJobResponse(title=file.filename, status="rejected", message="Skipped: File must be a PDF")
+    
+    try:
+        started_at = datetime.utcnow()
+        content_sha256 = await asyncio.get_running_loop().run_in_executor(None, file_sha256, file.file)
+        existing = await pipeline.find_duplicate(content_sha256=content_sha256)
+        if existing:
+            return IngestJobResponse(paper_id=existing["_id"], title=file.filename, status="duplicate",
+                                     message=f"Duplicate of {existing['title']}")
+        
+        paper_id = str(uuid.uuid4())
+        await pipeline.store_pdf(paper_id, file.file)
+        job = await ingest_queue.enqueue(paper_id, file.filename, upload_started_at=started_at,
+                                         content_sha256=content_sha256)
+        return IngestJobResponse(job_id=job["_id"], paper_id=paper_id, title=file.filename, status=job["status"])
+    except Exception as e:
+        return IngestJobResponse(title=file.filename, status="rejected", message=f"Error queueing paper: {str(e)}")
+
+@app.get("/papers/analysis-cache/stats")
+async def analysis_cache_stats():
+    """
+    Report the analysis cache's backend, size and hit rate.
+    """
+    return await analysis_cache.stats_async()
+
+@app.get("/llm/stats")
+async def llm_stats():
+    """
+    Report the OpenAI rate limits and how many calls were throttled, retried or failed.
+    """
+    if ai_client is None:
+        return {"calls": 0}
+    return ai_client.limiter.stats()
+
+@app.post("/papers/upload/", response_model=List[PaperUploadResponse])
+async def upload_papers(files: List[UploadFile] = File(...), background: bool = False):
+    """
+    Upload and process multiple papers. Stores the papers and their processed data in MongoDB.
+    Up to UPLOAD_CONCURRENCY files are processed at once; responses keep the order of the files.
+    With background=true the PDFs are only stored and queued, and the response is a 202
+    with one ingestion job per file, to be followed at GET /jobs/{job_id}.
+    """
+    if background:
+        jobs = [await _enqueue_upload(file) for file in files]
+        return JSONResponse(status_code=202, content=[job.dict() for job in jobs])
+    
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    
+    async def process(file: UploadFile) -> PaperUploadResponse:
+        async with semaphore:
+            return await _process_upload(file)
     
-    return responses
+    return await asyncio.gather(*(process(file) for file in files))
+
+@app.get("/jobs/{job_id}", response_model=IngestJobStatus, response_model_exclude_none=True)
+async def get_ingest_job(job_id: str):
+    """
+    Get the status of an ingestion job and of each of its stages.
+    """
+    job = await ingest_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestJobStatus(job_id=job["_id"], **{key: value for key, value in job.items() if key != "_id"})
 
 @app.get("/")
 async def root():
@@ -234,6 +511,10 @@ async def health_check():
 
 @app.get("/papers/{paper_id}/view")
 async def get_paper_pdf(paper_id: str):
+    """
+    Get a paper's PDF base64-encoded in JSON.
+    Kept for older clients; /papers/{paper_id}/download streams the file instead.
+    """
     try:
         print(f"Attempting to retrieve PDF with ID: {paper_id}")
         # Get PDF from GridFS using the correct method
@@ -268,17 +549,110 @@ async def get_paper_pdf(paper_id: str):
         print(f"Unexpected error retrieving PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}") 
 
+def _byte_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) byte range requested by a Range header, or None to send the
+    whole file. Raises a 416 HTTPException if the range lies outside the file.
+    """
+    if not range_header:
+        return None
+    match = BYTE_RANGE.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(length - int(last), 0)
+        end = length - 1
+    if start > end or start >= length:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+async def _pdf_chunks(grid_out, start: int, end: int):
+    """Yield bytes start..end (inclusive) of a GridFS file, one GridFS chunk at a time."""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+@app.get("/papers/{paper_id}/download")
+async def download_paper_pdf(paper_id: str, request: Request):
+    """
+    Stream a paper's PDF straight from GridFS.
+    Supports single byte ranges (206 Partial Content) and conditional requests through ETag.
+    """
+    try:
+        grid_out = await app.fs.open_download_stream_by_name(paper_id)
+    except Exception as e:
+        logger.debug("PDF %s not found in GridFS: %s", paper_id, e)
+        raise HTTPException(status_code=404, detail="PDF not found")
+    
+    length = grid_out.length
+    etag = f'"{grid_out.md5}"' if grid_out.md5 else f'"{paper_id}-{int(grid_out.upload_date.timestamp())}-{length}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'inline; filename="{paper_id}.pdf"',
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    # A Range sent with a stale If-Range validator gets the whole file
+    if_range = request.headers.get("if-range")
+    byte_range = _byte_range(request.headers.get("range"), length) if not if_range or if_range == etag else None
+    if byte_range is None:
+        start, end, status_code = 0, length - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        _pdf_chunks(grid_out, start, end),
+        status_code=status_code,
+        media_type="application/pdf",
+        headers=headers
+    )
+
 @app.post("/profiles/save", response_model=UserProfileResponse)
 async def save_user_profile(request: SaveProfileRequest):
     """
-    Save or update a user profile.
+    Save or update a user profile. Age, weight and height given as strings are converted
+    to numbers; a profile that isn't a valid CustomerProfile is rejected with a 422.
     """
     try:
-        success = await Database.save_user_profile(request.username, request.profile)
+        profile_dict = _validated_profile(request.profile)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    
+    try:
+        success = await Database.save_user_profile(request.username, profile_dict)
         if not success:
             raise HTTPException(status_code=400, detail="Failed to save profile")
             
         saved_profile = await Database.get_user_profile(request.username)
+        
+        # Re-index the profile and refresh its recorded matches
+        await profile_index.profile_saved(request.username, saved_profile["profile"])
+        papers, matcher = await catalog.matcher_for(saved_profile["profile"])
+        await Database.replace_user_matches(
+            request.username,
+            matcher.match_catalog(saved_profile["profile"])
+        )
+        
         return UserProfileResponse(
             username=saved_profile["username"],
             profile=saved_profile["profile"],
@@ -305,6 +679,17 @@ async def get_user_profile(username: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
+@app.get("/profiles/{username}/matches")
+async def get_user_matches(username: str):
+    """
+    Get the ids of the papers recorded as matching a saved profile.
+    """
+    try:
+        pairs = await Database.get_paper_matches(username=username)
+        return {"username": username, "paper_ids": [pair["paper_id"] for pair in pairs]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.delete("/profiles/{username}")
 async def delete_user_profile(username: str):
     """
@@ -314,6 +699,8 @@ async def delete_user_profile(username: str):
         success = await Database.delete_user_profile(username)
         if not success:
             raise HTTPException(status_code=404, detail="Profile not found")
+        await profile_index.profile_removed(username)
+        await Database.delete_paper_matches(username=username)
         return {"message": f"Profile {username} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -334,9 +721,13 @@ async def delete_paper(paper_id: str):
         # Delete paper metadata from papers collection
         db = Database.get_db()
         result = await db.papers.delete_one({"_id": paper_id})
+        await db.paper_contents.delete_one({"_id": paper_id})
         
+        await Database.delete_paper_matches(paper_id=paper_id)
+
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Paper not found")
+        await catalog.paper_removed(paper_id)
             
         return {"message": f"Paper {paper_id} deleted successfully"}
     except HTTPException:
@@ -344,14 +735,75 @@ async def delete_paper(paper_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
-@app.get("/papers")
-async def get_papers():
+@app.get("/papers/{paper_id}/matches")
+async def get_paper_matches(paper_id: str):
     """
-    Get all papers in the database.
+    Get the usernames of the saved profiles a paper matched.
+    """
+    try:
+        pairs = await Database.get_paper_matches(paper_id=paper_id)
+        return {"paper_id": paper_id, "usernames": [pair["username"] for pair in pairs]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/papers", response_model=PaperListResponse)
+async def get_papers(
+    request: Request,
+    fields: str = Query(",".join(DEFAULT_PAPER_FIELDS), description="Comma-separated fields to return"),
+    limit: Optional[int] = Query(None, ge=1, description="Page size: 50 by default and at most 500, unless streaming"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    stream: bool = False
+):
+    """
+    Get one page of papers in the database, without their text.
+    With stream=true or Accept: application/x-ndjson the papers are streamed from the
+    cursor as NDJSON, one paper per line, and limit is optional.
+    """
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PAPER_LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    streaming = _wants_stream(request, stream)
+    if not streaming:
+        limit = limit or 50
+        if limit > 500:
+            raise HTTPException(status_code=400, detail="limit must be at most 500")
+    
+    try:
+        db = Database.get_db()
+        query = {"_id": {"$gt": cursor}} if cursor else {}
+        if streaming:
+            papers = db.papers.find(query, {field: 1 for field in requested}).sort("_id", 1).limit(limit or 0)
+            
+            async def paper_lines():
+                async for paper in papers:
+                    yield json.dumps(paper, default=str) + "\n"
+            
+            return StreamingResponse(paper_lines(), media_type=NDJSON_MEDIA_TYPE)
+        
+        papers = await db.papers.find(query, {field: 1 for field in requested}) \
+            .sort("_id", 1).limit(limit).to_list(length=limit)
+        next_cursor = papers[-1]["_id"] if len(papers) == limit else None
+        return PaperListResponse(papers=papers, next_cursor=next_cursor)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/papers/{paper_id}")
+async def get_paper(paper_id: str, include_content: bool = False):
+    """
+    Get one paper with all of its processed data, and its extracted text if requested.
     """
     try:
         db = Database.get_db()
-        papers = await db.papers.find().to_list(length=None)
-        return papers
+        paper = await db.papers.find_one({"_id": paper_id}, {field: 0 for field in INTERNAL_PAPER_FIELDS})
+        if not paper:
+            raise HTTPException(status_code=404, detail="Paper not found")
+        if include_content:
+            stored = await db.paper_contents.find_one({"_id": paper_id})
+            paper["content"] = stored["content"] if stored else None
+        return paper
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
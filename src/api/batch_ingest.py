@@ -0,0 +1,277 @@
+"""
+Batch ingestion of a directory of PDFs, restartable at any point.
+
+Every PDF found is recorded in a manifest with its size, mtime, SHA-256 and pipeline stage.
+New and changed PDFs are stored in GridFS and queued as ingestion jobs, which the workers
+of this process extract, analyze and store with the same pipeline as background uploads
+to /papers/upload/. The manifest is updated as each paper moves through its stages,
+so an interrupted run picks up where it stopped: finished PDFs are skipped and queued
+ones resume from their last finished stage. From the root directory:
+
+    python -m src.api.batch_ingest data/papers/raw --workers 8 --extract-workers 4
+
+A changed PDF is ingested as a new paper; the paper stored from its earlier version is kept.
+"""
+import argparse
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.ai.analysis_cache import create_analysis_cache
+from src.ai.openai_client import OpenAIClient
+from src.core.paper_processor import PdfExtractor, file_sha256
+from src.core.percolator import ProfilePercolator
+from src.core.profile_matcher import ProfileMatcher
+from .catalog import PushdownCatalog
+from .database import Database
+from .ingest import IngestionQueue
+from .pipeline import IngestionPipeline
+from .profile_index import SavedProfileIndex
+
+logger = logging.getLogger(__name__)
+
+# Manifest stages of PDFs that are not ingested again while unchanged
+FINISHED_STAGES = {"done", "duplicate"}
+
+
+class IngestManifest:
+    """
+    Size, mtime, content hash and pipeline stage of every PDF a batch ingestion has seen,
+    in a local SQLite file. Each change is committed at once, so the manifest survives crashes.
+    The manifest is locked while open, so only one batch ingestion uses it at a time.
+
+    Stages are "upload" (a paper_id is reserved and the PDF is being stored), then the stage
+    of its ingestion job ("upload", "extract", "analyze", "store"), and finally "done",
+    "duplicate" or "failed".
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA locking_mode=EXCLUSIVE")
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT, "
+            "stage TEXT, paper_id TEXT, job_id TEXT, message TEXT, updated REAL)"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def swap_owner(self, owner: str) -> Optional[str]:
+        """Record the ingestion queue owner of this run, returning the one of the previous run."""
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'owner'").fetchone()
+        self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('owner', ?)", (owner,))
+        return row["value"] if row else None
+
+    def get(self, path: str) -> Optional[Dict]:
+        row = self._connection.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def set(self, path: str, **fields) -> None:
+        """Create or update the entry of a PDF."""
+        fields["updated"] = time.time()
+        if self.get(path) is None:
+            fields["path"] = path
+            columns = ", ".join(fields)
+            self._connection.execute(
+                f"INSERT INTO files ({columns}) VALUES ({', '.join('?' for _ in fields)})", list(fields.values())
+            )
+        else:
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            self._connection.execute(f"UPDATE files SET {assignments} WHERE path = ?", [*fields.values(), path])
+
+    def counts(self, paths: List[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for path in paths:
+            entry = self.get(path)
+            stage = entry["stage"] if entry else "pending"
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def _sha256(path: Path) -> str:
+    with open(path, "rb") as file:
+        return file_sha256(file)
+
+
+class BatchIngestion:
+    """Feeds the PDFs of a directory to the ingestion queue, keeping at most max_queued jobs outstanding."""
+
+    def __init__(self, manifest: IngestManifest, queue: IngestionQueue, pipeline: IngestionPipeline,
+                 max_queued: int = 100, retry_failed: bool = False, poll_interval: float = 1.0):
+        self.manifest = manifest
+        self.queue = queue
+        self.pipeline = pipeline
+        self.max_queued = max_queued
+        self.retry_failed = retry_failed
+        self.poll_interval = poll_interval
+        # Outstanding job ids and the PDFs they ingest
+        self.outstanding: Dict[str, str] = {}
+        self.finished = 0
+
+    async def _needs_ingestion(self, path: Path) -> bool:
+        """Whether a PDF still has to be queued, resuming its job if one is outstanding."""
+        key = str(path)
+        stat = path.stat()
+        entry = self.manifest.get(key)
+        if entry and (entry["size"], entry["mtime"]) != (stat.st_size, stat.st_mtime):
+            sha256 = await asyncio.get_running_loop().run_in_executor(None, _sha256, path)
+            if sha256 != entry["sha256"]:
+                # Changed content is a new paper
+                self.manifest.set(key, size=stat.st_size, mtime=stat.st_mtime, sha256=sha256,
+                                  stage="pending", paper_id=None, job_id=None, message=None)
+                return True
+            self.manifest.set(key, size=stat.st_size, mtime=stat.st_mtime)
+        if entry is None:
+            return True
+        if entry["stage"] in FINISHED_STAGES:
+            return False
+        if entry["stage"] == "failed":
+            return self.retry_failed
+        if entry["job_id"] and await self.queue.get(entry["job_id"]) is not None:
+            self.outstanding[entry["job_id"]] = key
+            return False
+        return True
+
+    async def _enqueue(self, path: Path) -> None:
+        """Store one PDF in GridFS and queue its ingestion, unless its bytes match a stored paper."""
+        started_at = datetime.utcnow()
+        key = str(path)
+        stat = path.stat()
+        entry = self.manifest.get(key)
+        sha256 = entry["sha256"] if entry and entry["sha256"] else \
+            await asyncio.get_running_loop().run_in_executor(None, _sha256, path)
+        existing = await self.pipeline.find_duplicate(content_sha256=sha256)
+        if existing:
+            self.manifest.set(key, size=stat.st_size, mtime=stat.st_mtime, sha256=sha256, stage="duplicate",
+                              paper_id=existing["_id"], job_id=None, message=f"Duplicate of {existing['title']}")
+            self._report(key, "duplicate")
+            return
+
+        if entry and entry["stage"] == "upload" and entry["paper_id"]:
+            # An earlier run stopped while storing this PDF; remove what it stored
+            async for grid_out in Database.get_fs().find({"_id": entry["paper_id"]}):
+                await Database.get_fs().delete(grid_out._id)
+        paper_id = str(uuid.uuid4())
+        self.manifest.set(key, size=stat.st_size, mtime=stat.st_mtime, sha256=sha256, stage="upload",
+                          paper_id=paper_id, job_id=None, message=None)
+        with open(path, "rb") as file:
+            await self.pipeline.store_pdf(paper_id, file)
+        job = await self.queue.enqueue(paper_id, path.name, upload_started_at=started_at, content_sha256=sha256)
+        self.manifest.set(key, stage=job["stage"], job_id=job["_id"])
+        self.outstanding[job["_id"]] = key
+
+    async def _poll(self) -> None:
+        """Record the progress of outstanding jobs in the manifest."""
+        jobs = self.queue.collection.find(
+            {"_id": {"$in": list(self.outstanding)}},
+            {"status": 1, "stage": 1, "paper_id": 1, "message": 1, "duplicate": 1}
+        )
+        async for job in jobs:
+            key = self.outstanding[job["_id"]]
+            if job["status"] == "done":
+                stage = "duplicate" if job.get("duplicate") else "done"
+            elif job["status"] == "failed":
+                stage = "failed"
+            else:
+                stage = job["stage"]
+            if stage != self.manifest.get(key)["stage"]:
+                self.manifest.set(key, stage=stage, paper_id=job["paper_id"], message=job.get("message"))
+            if job["status"] in ("done", "failed"):
+                del self.outstanding[job["_id"]]
+                self._report(key, stage, job.get("message"))
+
+    def _report(self, key: str, stage: str, message: Optional[str] = None) -> None:
+        self.finished += 1
+        print(f"[{self.finished}] {Path(key).name}: {stage}" + (f" ({message})" if message else ""))
+
+    async def run(self, paths: List[Path]) -> None:
+        pending = [path for path in paths if await self._needs_ingestion(path)]
+        print(f"Found {len(paths)} PDFs: {len(pending)} to ingest, {len(self.outstanding)} resumed, "
+              f"{len(paths) - len(pending) - len(self.outstanding)} unchanged.")
+        pending.reverse()
+        while pending or self.outstanding:
+            while pending and len(self.outstanding) < self.max_queued:
+                path = pending.pop()
+                try:
+                    await self._enqueue(path)
+                except Exception as e:
+                    logger.error("Error queueing %s: %s", path, e)
+                    self.manifest.set(str(path), stage="failed", message=f"Error queueing paper: {str(e)}")
+                    self._report(str(path), "failed", str(e))
+            if self.outstanding:
+                await asyncio.sleep(self.poll_interval)
+                await self._poll()
+
+
+async def ingest_directory(directory: str, manifest_path: str, workers: Optional[int] = None,
+                           extract_workers: Optional[int] = None, max_queued: int = 100,
+                           retry_failed: bool = False) -> Dict[str, int]:
+    """
+    Ingest every PDF under directory that the manifest doesn't record as ingested.
+    Returns the number of PDFs in each manifest stage.
+
+    Only what ingestion needs is started: the database connection, the saved profiles
+    (to record the users each new paper matches), the extraction workers and the ingestion
+    queue. Papers are compiled one at a time as they are stored, without loading the catalog,
+    and the version bump of each one makes the API workers pick it up.
+    """
+    paths = sorted(path.resolve() for path in Path(directory).rglob("*.pdf") if path.is_file())
+    manifest = IngestManifest(manifest_path)
+    queue = IngestionQueue(workers=workers)
+    extractor = PdfExtractor(workers=extract_workers)
+    ai_client = OpenAIClient(cache=create_analysis_cache())
+    percolator = ProfilePercolator()
+    pipeline = IngestionPipeline(PushdownCatalog(ProfileMatcher()), percolator, extractor, lambda: ai_client)
+
+    await Database.connect_db()
+    try:
+        await SavedProfileIndex(percolator).sync(force=True)
+        # Jobs the previous run was working on when it stopped can be claimed again at once
+        previous_owner = manifest.swap_owner(queue.owner)
+        if previous_owner:
+            await queue.release(previous_owner)
+        queue.start(pipeline.run_job, cleanup=pipeline.discard_job)
+        await BatchIngestion(manifest, queue, pipeline, max_queued, retry_failed).run(paths)
+        return manifest.counts([str(path) for path in paths])
+    finally:
+        queue.stop()
+        await queue.release()
+        extractor.shutdown()
+        await Database.close_db()
+        manifest.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs into the paper database")
+    parser.add_argument("directory", nargs="?", default="data/papers/raw", help="directory searched for PDFs")
+    parser.add_argument("--manifest", default="data/ingest_manifest.sqlite3", help="manifest of ingested PDFs")
+    parser.add_argument("--workers", type=int, help="papers ingested at the same time (default INGEST_WORKERS)")
+    parser.add_argument("--extract-workers", type=int,
+                        help="processes extracting PDF text (default PDF_EXTRACT_WORKERS)")
+    parser.add_argument("--max-queued", type=int, default=100, help="most papers stored and queued ahead of the workers")
+    parser.add_argument("--retry-failed", action="store_true", help="ingest PDFs that failed in earlier runs again")
+    args = parser.parse_args()
+
+    try:
+        counts = asyncio.run(ingest_directory(
+            args.directory, args.manifest, args.workers, args.extract_workers, max(args.max_queued, 1), args.retry_failed
+        ))
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"Could not open manifest {args.manifest} ({e}); is another batch ingestion using it?")
+    print("\nIngestion Summary:")
+    print("-" * 50)
+    for stage, count in sorted(counts.items()):
+        print(f"{stage}: {count}")
+
+
+if __name__ == "__main__":
+    main()
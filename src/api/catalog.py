@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from src.core.condition_parser import CompiledCondition
+from src.core.match_query import match_fields, candidate_query
+from src.core.profile_matcher import ProfileMatcher
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+# Only the fields needed to match a paper and build its PaperMatch
+CATALOG_PROJECTION = {
+    "title": 1,
+    "processed_data.ideal_profile": 1,
+    "processed_data.conditions": 1,
+    "processed_data.summary": 1,
+}
+
+
+class PaperCatalog:
+    """
+    In-process copy of the matching-relevant fields of every paper, compiled into a ProfileMatcher.
+
+    Uploads and deletes bump a version counter stored in the catalog_meta collection.
+    Each worker watches that counter (through a change stream, or by polling when the
+    deployment doesn't support change streams) and re-syncs when it moves, so /match/
+    never has to read the papers collection.
+    """
+
+    def __init__(self, profile_matcher: ProfileMatcher, poll_interval: Optional[float] = None):
+        self.profile_matcher = profile_matcher
+        self.papers: Dict[str, dict] = {}
+        self.version: Optional[int] = None
+        # Changes made by this worker that the stored version doesn't account for yet
+        self.local_changes = 0
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv("CATALOG_POLL_INTERVAL", "2"))
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    @property
+    def cache_version(self) -> str:
+        """Identifies the catalog contents; changes whenever a paper is added or removed."""
+        return f"{self.version}.{self.local_changes}"
+
+    def match_fields(self, paper: dict) -> Optional[Dict]:
+        """The match_fields to store on a paper document, or None if its conditions don't compile."""
+        try:
+            return match_fields(self.profile_matcher.condition_parser.compile(
+                paper['processed_data']['conditions'],
+                paper['processed_data']['ideal_profile'] or {}
+            ))
+        except Exception as e:
+            logger.error("Error processing paper %s: %s", paper.get('_id', 'unknown'), e)
+            return None
+
+    async def backfill_match_fields(self) -> None:
+        """Store match_fields on papers uploaded before they existed."""
+        db = Database.get_db()
+        filled = 0
+        async for paper in db.papers.find({"match_fields": {"$exists": False}}, CATALOG_PROJECTION):
+            fields = self.match_fields(paper)
+            if fields is not None:
+                await db.papers.update_one({"_id": paper["_id"]}, {"$set": {"match_fields": fields}})
+                filled += 1
+        if filled:
+            logger.info("Stored match_fields on %d papers", filled)
+
+    async def matcher_for(self, profile: Dict) -> Tuple[Dict[str, dict], ProfileMatcher]:
+        """Papers a profile should be matched against, and the matcher holding their compiled conditions."""
+        await self.ensure_loaded()
+        return self.papers, self.profile_matcher
+
+    def add(self, paper: dict, syncing: bool = False) -> Optional[CompiledCondition]:
+        """
+        Add a paper document (or the projected fields of one) to the catalog. Changes made
+        while syncing are already accounted for by the stored version.
+        """
+        try:
+            compiled = self.profile_matcher.add_paper(paper['_id'], {
+                'ideal_profile': paper['processed_data']['ideal_profile'],
+                'conditions': paper['processed_data']['conditions']
+            })
+        except Exception as e:
+            logger.error("Error processing paper %s: %s", paper.get('_id', 'unknown'), e)
+            return None
+        if not syncing:
+            self.local_changes += 1
+        self.papers[paper['_id']] = {
+            '_id': paper['_id'],
+            'title': paper['title'],
+            'processed_data': {
+                'ideal_profile': paper['processed_data']['ideal_profile'],
+                'conditions': paper['processed_data']['conditions'],
+                'summary': paper['processed_data']['summary'],
+            }
+        }
+        return compiled
+
+    def remove(self, paper_id: str, syncing: bool = False) -> None:
+        self.papers.pop(paper_id, None)
+        self.profile_matcher.forget_paper(paper_id)
+        if not syncing:
+            self.local_changes += 1
+
+    async def paper_added(self, paper: dict) -> Optional[CompiledCondition]:
+        """
+        Add a paper this worker just stored and record the change for every worker.
+        Holds the sync lock, so a sync in progress can't miss or undo the change.
+        """
+        async with self._lock:
+            compiled = self.add(paper)
+            await self.bump_version()
+        return compiled
+
+    async def paper_removed(self, paper_id: str) -> None:
+        """Remove a paper this worker just deleted and record the change for every worker."""
+        async with self._lock:
+            self.remove(paper_id)
+            await self.bump_version()
+
+    async def _read_version(self) -> int:
+        meta = await Database.get_db().catalog_meta.find_one({"_id": "papers"})
+        return meta["version"] if meta else 0
+
+    async def bump_version(self) -> int:
+        """
+        Record a change to the papers collection so every worker re-syncs.
+        Called once per add or remove made by this worker, under the sync lock.
+        """
+        meta = await Database.get_db().catalog_meta.find_one_and_update(
+            {"_id": "papers"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # No other worker changed the catalog in between, so this worker is in sync at the new version
+        if self.version is not None and meta["version"] == self.version + 1 and self.local_changes > 0:
+            self.version = meta["version"]
+            self.local_changes -= 1
+        return meta["version"]
+
+    async def ensure_loaded(self) -> None:
+        if not self.loaded:
+            await self.sync(force=True)
+
+    async def sync(self, force: bool = False) -> None:
+        """
+        Bring the catalog in line with the papers collection if its version changed.
+        Only papers that are new to this worker are read in full.
+        """
+        async with self._lock:
+            version = await self._read_version()
+            if not force and version == self.version:
+                return
+
+            db = Database.get_db()
+            paper_ids = set(await db.papers.distinct("_id"))
+            new_ids = [paper_id for paper_id in paper_ids if paper_id not in self.papers]
+            if new_ids:
+                async for paper in db.papers.find({"_id": {"$in": new_ids}}, CATALOG_PROJECTION):
+                    self.add(paper, syncing=True)
+            for paper_id in [paper_id for paper_id in self.papers if paper_id not in paper_ids]:
+                self.remove(paper_id, syncing=True)
+
+            # Local changes are made under the lock, so the version read above accounts for all of them
+            self.version = version
+            self.local_changes = 0
+            logger.info("Paper catalog at version %d with %d papers", version, len(self.papers))
+
+    async def watch(self, on_tick: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+        """
+        Keep the catalog fresh until cancelled. on_tick, if given, runs after every sync
+        check, to refresh other state versioned in catalog_meta.
+        """
+        await self.ensure_loaded()
+        try:
+            async with Database.get_db().catalog_meta.watch() as stream:
+                async for _ in stream:
+                    await self.sync()
+                    if on_tick is not None:
+                        await on_tick()
+        except Exception as e:
+            logger.info("Catalog change stream unavailable (%s), polling every %ss", e, self.poll_interval)
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.sync()
+                if on_tick is not None:
+                    await on_tick()
+            except Exception as e:
+                logger.error("Error syncing paper catalog: %s", e)
+
+
+class PushdownCatalog(PaperCatalog):
+    """
+    Catalog for deployments whose papers don't fit in every worker's memory.
+
+    Only the version is kept in process. For each profile, MongoDB selects the candidate
+    papers through the indexed match_fields stored on every document, and the conditions
+    of those candidates are compiled and evaluated exactly.
+    """
+
+    def add(self, paper: dict, syncing: bool = False) -> Optional[CompiledCondition]:
+        """Compile a new paper's conditions without keeping the paper in memory."""
+        try:
+            compiled = self.profile_matcher.condition_parser.compile(
+                paper['processed_data']['conditions'],
+                paper['processed_data']['ideal_profile'] or {}
+            )
+        except Exception as e:
+            logger.error("Error processing paper %s: %s", paper.get('_id', 'unknown'), e)
+            return None
+        if not syncing:
+            self.local_changes += 1
+        return compiled
+
+    def remove(self, paper_id: str, syncing: bool = False) -> None:
+        if not syncing:
+            self.local_changes += 1
+
+    async def sync(self, force: bool = False) -> None:
+        async with self._lock:
+            self.version = await self._read_version()
+            self.local_changes = 0
+
+    async def matcher_for(self, profile: Dict) -> Tuple[Dict[str, dict], ProfileMatcher]:
+        await self.ensure_loaded()
+        matcher = ProfileMatcher()
+        papers = {}
+        async for paper in Database.get_db().papers.find(candidate_query(profile), CATALOG_PROJECTION):
+            try:
+                matcher.add_paper(paper['_id'], {
+                    'ideal_profile': paper['processed_data']['ideal_profile'],
+                    'conditions': paper['processed_data']['conditions']
+                })
+            except Exception as e:
+                logger.error("Error processing paper %s: %s", paper.get('_id', 'unknown'), e)
+                continue
+            papers[paper['_id']] = paper
+        logger.debug("MongoDB returned %d candidate papers", len(papers))
+        return papers, matcher
@@ -1,32 +1,77 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo.errors import BulkWriteError
+from typing import Dict, List, Optional
 import os
 from datetime import datetime
 
+from src.core.match_query import MATCH_FIELD_INDEXES
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     db: Optional[AsyncIOMotorDatabase] = None
+    fs: Optional[AsyncIOMotorGridFSBucket] = None
     
     @classmethod
     async def connect_db(cls):
         """Connect to MongoDB."""
         try:
             cls.client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
-            cls.db = cls.client.research_matcher
+            cls.db = cls.client[os.getenv("MONGODB_DB", "research_matcher")]
+            cls.fs = AsyncIOMotorGridFSBucket(cls.db)
             
             # Create indexes for user profiles
             await cls.db.user_profiles.create_index("username", unique=True)
             
+            # Create indexes for (username, paper_id) match pairs
+            await cls.db.paper_matches.create_index([("username", 1), ("paper_id", 1)], unique=True)
+            await cls.db.paper_matches.create_index("paper_id")
+            
+            # Create indexes for the match_fields used to pre-filter papers in MongoDB
+            for keys in MATCH_FIELD_INDEXES:
+                await cls.db.papers.create_index(keys)
+            
+            # Create unique indexes for the hashes that identify duplicate uploads
+            for field in ("content_sha256", "text_sha256"):
+                await cls.db.papers.create_index(
+                    field, unique=True, partialFilterExpression={field: {"$exists": True}}
+                )
+            
+            # Create indexes for claiming queued ingestion jobs in order
+            await cls.db.ingest_jobs.create_index([("status", 1), ("created_at", 1)])
+            
+            # Move extracted text stored by older versions out of the papers collection
+            await cls.migrate_paper_content()
+            
             print("Connected to MongoDB.")
         except Exception as e:
             print(f"Could not connect to MongoDB: {e}")
             raise e
 
+    @classmethod
+    async def migrate_paper_content(cls):
+        """Move the content field of paper documents into the paper_contents collection."""
+        moved = 0
+        async for paper in cls.db.papers.find({"content": {"$exists": True}}, {"content": 1}):
+            await cls.db.paper_contents.update_one(
+                {"_id": paper["_id"]},
+                {"$set": {"content": paper["content"]}},
+                upsert=True
+            )
+            await cls.db.papers.update_one({"_id": paper["_id"]}, {"$unset": {"content": ""}})
+            moved += 1
+        if moved:
+            print(f"Moved the text of {moved} papers to paper_contents.")
+
     @classmethod
     def get_db(cls) -> AsyncIOMotorDatabase:
         """Get database instance."""
         return cls.db
 
+    @classmethod
+    def get_fs(cls) -> AsyncIOMotorGridFSBucket:
+        """Get the GridFS bucket holding the paper PDFs."""
+        return cls.fs
+
     @classmethod
     async def close_db(cls):
         """Close database connection."""
@@ -105,6 +150,19 @@ class Database:
             print(f"Error retrieving user profile: {e}")
             return None
 
+    @classmethod
+    async def get_user_profiles(cls, usernames: List[str]) -> Dict[str, dict]:
+        """
+        Retrieve several user profiles in one query.
+        Returns a dict keyed by username; unknown usernames are left out.
+        """
+        try:
+            profiles = await cls.db.user_profiles.find({"username": {"$in": usernames}}).to_list(length=None)
+            return {profile["username"]: profile for profile in profiles}
+        except Exception as e:
+            print(f"Error retrieving user profiles: {e}")
+            return {}
+
     @classmethod
     async def delete_user_profile(cls, username: str) -> bool:
         """
@@ -116,4 +174,60 @@ class Database:
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting user profile: {e}")
-            return False 
\ No newline at end of file
+            return False 
+
+    @classmethod
+    async def save_paper_matches(cls, paper_id: str, usernames: List[str]) -> None:
+        """Record the saved users a paper matches."""
+        if not usernames:
+            return
+        matched_at = datetime.utcnow()
+        await cls._insert_matches([
+            {"username": username, "paper_id": paper_id, "matched_at": matched_at}
+            for username in usernames
+        ])
+
+    @classmethod
+    async def replace_user_matches(cls, username: str, paper_ids: List[str]) -> None:
+        """Replace the recorded paper matches of a user."""
+        await cls.db.paper_matches.delete_many({"username": username})
+        if not paper_ids:
+            return
+        matched_at = datetime.utcnow()
+        await cls._insert_matches([
+            {"username": username, "paper_id": paper_id, "matched_at": matched_at}
+            for paper_id in paper_ids
+        ])
+
+    @classmethod
+    async def _insert_matches(cls, pairs: List[dict]) -> None:
+        """
+        Insert match pairs, skipping those already recorded. A paper stored while its matching
+        user is saved has its pair written by both requests.
+        """
+        try:
+            await cls.db.paper_matches.insert_many(pairs, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    @classmethod
+    async def get_paper_matches(cls, paper_id: Optional[str] = None, username: Optional[str] = None) -> List[dict]:
+        """Retrieve recorded match pairs for a paper and/or a user."""
+        query = {}
+        if paper_id is not None:
+            query["paper_id"] = paper_id
+        if username is not None:
+            query["username"] = username
+        return await cls.db.paper_matches.find(query, {"_id": 0}).to_list(length=None)
+
+    @classmethod
+    async def delete_paper_matches(cls, paper_id: Optional[str] = None, username: Optional[str] = None) -> None:
+        """Delete recorded match pairs for a paper or a user."""
+        query = {}
+        if paper_id is not None:
+            query["paper_id"] = paper_id
+        if username is not None:
+            query["username"] = username
+        if query:
+            await cls.db.paper_matches.delete_many(query)
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+# Stages every ingestion job goes through, in order
+STAGES = ["upload", "extract", "analyze", "store"]
+
+
+class IngestionQueue:
+    """
+    Paper ingestion jobs, kept in the ingest_jobs collection and run by background workers.
+
+    A worker claims a queued job by taking a lease on it, and every stage it starts renews
+    the lease. Jobs whose lease runs out (because their worker died or the server restarted)
+    are claimed again, up to max_attempts times. The handler records the outcome of each stage
+    on the job, so a resumed job skips the stages it already finished.
+
+    With workers=0 the process only enqueues jobs, leaving them to other processes.
+    Jobs record the owner id of the queue whose worker claimed them.
+    """
+
+    def __init__(self, workers: Optional[int] = None, poll_interval: Optional[float] = None,
+                 lease: Optional[float] = None, max_attempts: Optional[int] = None):
+        self.handler: Optional[Callable[[dict, "IngestionQueue"], Awaitable[Dict]]] = None
+        self.cleanup: Optional[Callable[[dict], Awaitable[None]]] = None
+        self.workers = workers if workers is not None else int(os.getenv("INGEST_WORKERS", "2"))
+        self.poll_interval = poll_interval if poll_interval is not None else float(os.getenv("INGEST_POLL_INTERVAL", "1"))
+        self.lease = lease if lease is not None else float(os.getenv("INGEST_JOB_LEASE", "600"))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+        self.owner = str(uuid.uuid4())
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def collection(self):
+        return Database.get_db().ingest_jobs
+
+    async def enqueue(self, paper_id: str, filename: str, upload_started_at: Optional[datetime] = None,
+                      **fields) -> dict:
+        """
+        Queue the ingestion of a PDF already stored in GridFS under paper_id. Its upload
+        stage is recorded as running from upload_started_at until now.
+        Extra fields are stored on the job for its handler.
+        """
+        now = datetime.utcnow()
+        job = {
+            "_id": str(uuid.uuid4()),
+            "paper_id": paper_id,
+            "filename": filename,
+            "status": "queued",
+            "stage": STAGES[0],
+            "stages": {stage: {"status": "pending"} for stage in STAGES},
+            "attempts": 0,
+            "message": None,
+            "created_at": now,
+            "updated_at": now,
+            **fields,
+        }
+        job["stages"][STAGES[0]] = {"status": "done", "started_at": upload_started_at or now, "finished_at": now}
+        await self.collection.insert_one(job)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def update(self, job_id: str, fields: Dict) -> None:
+        """Record fields on a job and renew its lease."""
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {**fields, "updated_at": now, "locked_until": now + timedelta(seconds=self.lease)}}
+        )
+
+    @asynccontextmanager
+    async def stage(self, job: dict, stage: str):
+        """Mark a stage of a job as running for the duration of the block, then done or failed."""
+        await self.update(job["_id"], {
+            "stage": stage,
+            f"stages.{stage}": {"status": "running", "started_at": datetime.utcnow()},
+        })
+        try:
+            yield
+        except Exception:
+            await self.update(job["_id"], {f"stages.{stage}.status": "failed",
+                                           f"stages.{stage}.finished_at": datetime.utcnow()})
+            raise
+        job["stages"][stage] = {"status": "done"}
+        await self.update(job["_id"], {f"stages.{stage}.status": "done",
+                                       f"stages.{stage}.finished_at": datetime.utcnow()})
+
+    async def _give_up(self, now: datetime) -> None:
+        """Fail the jobs whose lease ran out on their last attempt, removing what they stored."""
+        while True:
+            job = await self.collection.find_one_and_update(
+                {"status": "running", "locked_until": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+                {"$set": {"status": "failed", "updated_at": now,
+                          "message": f"Gave up after {self.max_attempts} attempts"}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                return
+            logger.error("Gave up on ingestion job %s after %d attempts", job["_id"], self.max_attempts)
+            if self.cleanup is not None:
+                try:
+                    await self.cleanup(job)
+                except Exception as e:
+                    logger.error("Error cleaning up ingestion job %s: %s", job["_id"], e)
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        await self._give_up(now)
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {"status": "running", "updated_at": now, "owner": self.owner,
+                         "locked_until": now + timedelta(seconds=self.lease)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def release(self, owner: Optional[str] = None) -> int:
+        """
+        End the leases of the running jobs claimed by owner (this queue by default), so any
+        worker can claim them again at once. Only for owners whose workers are known to be stopped.
+        """
+        result = await self.collection.update_many(
+            {"status": "running", "owner": owner or self.owner},
+            {"$set": {"locked_until": datetime.utcnow()}}
+        )
+        return result.modified_count
+
+    async def _run(self, job: dict) -> None:
+        logger.info("Running ingestion job %s (%s), attempt %d", job["_id"], job["filename"], job["attempts"])
+        try:
+            result = await self.handler(job, self)
+        except Exception as e:
+            logger.error("Ingestion job %s failed: %s", job["_id"], e)
+            await self.update(job["_id"], {"status": "failed", "message": str(e)})
+            return
+        await self.update(job["_id"], {"status": "done", "stage": STAGES[-1], **result})
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error("Error claiming ingestion job: %s", e)
+                job = None
+            if job is not None:
+                await self._run(job)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, handler: Callable[[dict, "IngestionQueue"], Awaitable[Dict]],
+              cleanup: Optional[Callable[[dict], Awaitable[None]]] = None) -> None:
+        """
+        Start the background workers. The handler runs the stages of a job and returns
+        the fields to record on it once it is done. cleanup, if given, is called with every
+        job given up after max_attempts, to remove what it stored.
+        """
+        self.handler = handler
+        self.cleanup = cleanup
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
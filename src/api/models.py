@@ -1,5 +1,5 @@
 from typing import List, Optional, Dict, Any, Union
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from src.models.profile import CustomerProfile
 
@@ -10,6 +10,14 @@ class PaperMatch(BaseModel):
     match_score: float
     download_url: Optional[str] = None
 
+class PaperExplanation(BaseModel):
+    paper_id: str
+    title: str
+    conditions: str
+    matched: bool
+    candidate: bool
+    trace: Dict[str, Any]
+
 class ProfileResponse(BaseModel):
     profile_id: str
     message: str = "Profile successfully created"
@@ -18,12 +26,55 @@ class MatchResponse(BaseModel):
     profile_id: str
     matches: List[PaperMatch]
     total_matches: int
+    explanations: Optional[List[PaperExplanation]] = None
+
+class BatchMatchRequest(BaseModel):
+    profiles: List[CustomerProfile] = []
+    usernames: List[str] = []
+    stream: bool = False
+    limit: Optional[int] = Field(None, ge=1)
+    offset: int = Field(0, ge=0)
+
+class BatchMatchResponse(BaseModel):
+    results: List[MatchResponse]
+    missing_profiles: List[str] = []
+    invalid_profiles: List[str] = []
 
 class PaperUploadResponse(BaseModel):
     paper_id: str
     title: str
     message: str = "Paper successfully processed"
     summary: Optional[str] = None
+    duplicate: bool = False
+
+class IngestJobResponse(BaseModel):
+    job_id: Optional[str] = None
+    paper_id: Optional[str] = None
+    title: str
+    status: str
+    message: Optional[str] = None
+
+class IngestStage(BaseModel):
+    status: str
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class IngestJobStatus(BaseModel):
+    job_id: str
+    paper_id: str
+    filename: str
+    status: str
+    stage: str
+    stages: Dict[str, IngestStage]
+    attempts: int
+    message: Optional[str] = None
+    duplicate: bool = False
+    created_at: datetime
+    updated_at: datetime
+
+class PaperListResponse(BaseModel):
+    papers: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     detail: str 
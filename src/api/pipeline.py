@@ -0,0 +1,145 @@
+import logging
+from typing import BinaryIO, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from src.ai.openai_client import OpenAIClient
+from src.core.paper_processor import PdfExtractor, text_hash
+from src.core.percolator import ProfilePercolator
+from .catalog import PaperCatalog
+from .database import Database
+from .ingest import IngestionQueue
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionPipeline:
+    """
+    The steps that turn a PDF into a stored, analyzed paper, shared by the API's uploads
+    and the batch ingestion CLI.
+
+    Stored papers are added to catalog and matched against the saved profiles indexed in
+    percolator. Text is extracted by extractor and analyzed by the client ai_client returns,
+    which is called on every analysis so the client can be created on first use.
+    """
+
+    def __init__(self, catalog: PaperCatalog, percolator: ProfilePercolator, extractor: PdfExtractor,
+                 ai_client: Callable[[], OpenAIClient]):
+        self.catalog = catalog
+        self.percolator = percolator
+        self.extractor = extractor
+        self.ai_client = ai_client
+
+    async def find_duplicate(self, content_sha256: Optional[str] = None, text_sha256: Optional[str] = None,
+                             exclude_id: Optional[str] = None) -> Optional[dict]:
+        """The stored paper, other than exclude_id, with the same PDF bytes or the same normalized text, if any."""
+        query = {"$or": [{field: value} for field, value in
+                         (("content_sha256", content_sha256), ("text_sha256", text_sha256)) if value]}
+        if exclude_id:
+            query["_id"] = {"$ne": exclude_id}
+        return await Database.get_db().papers.find_one(query, {"title": 1, "processed_data.summary": 1})
+
+    async def store_pdf(self, paper_id: str, file: BinaryIO) -> None:
+        """Stream a PDF from a binary file (an upload's spooled file, or one on disk) into GridFS, one chunk at a time."""
+        file.seek(0)
+        await Database.get_fs().upload_from_stream_with_id(
+            paper_id,
+            paper_id,
+            file,
+            metadata={"content_type": "application/pdf"}
+        )
+
+    async def discard_paper(self, paper_id: str) -> None:
+        """
+        Remove everything stored for a paper whose ingestion failed: its PDF, its text and,
+        if it got as far as being stored, the paper itself and its catalog entry.
+        """
+        try:
+            await Database.get_fs().delete(paper_id)
+        except Exception as e:
+            logger.error("Error deleting PDF %s from GridFS: %s", paper_id, e)
+        db = Database.get_db()
+        await db.paper_contents.delete_one({"_id": paper_id})
+        if (await db.papers.delete_one({"_id": paper_id})).deleted_count:
+            await Database.delete_paper_matches(paper_id=paper_id)
+            await self.catalog.paper_removed(paper_id)
+
+    async def discard_job(self, job: dict) -> None:
+        """Remove what an ingestion job the queue gave up on stored, unless it finished storing its paper."""
+        if job["stages"]["store"]["status"] != "done":
+            await self.discard_paper(job["paper_id"])
+
+    async def store_paper(self, paper_id: str, title: str, analysis: Dict, hashes: Dict[str, str]) -> None:
+        """
+        Save an analyzed paper, add it to the catalog and record the saved users it matches.
+        Raises DuplicateKeyError if a stored paper has the same content or text hash.
+        """
+        paper_data = {
+            "_id": paper_id,
+            "title": title,
+            "processed_data": {
+                "ideal_profile": analysis["ideal_profile"],
+                "conditions": analysis["conditions"],
+                "summary": analysis["summary"]
+            },
+            **hashes
+        }
+        paper_data["match_fields"] = self.catalog.match_fields(paper_data)
+
+        await Database.get_db().papers.replace_one({"_id": paper_id}, paper_data, upsert=True)
+        compiled = await self.catalog.paper_added(paper_data)
+
+        # Record which saved users the new paper matches. The paper is stored either way;
+        # its matches are recorded again whenever a matching user saves their profile.
+        try:
+            matched_users = self.percolator.match_paper(compiled) if compiled else []
+            await Database.delete_paper_matches(paper_id=paper_id)
+            await Database.save_paper_matches(paper_id, matched_users)
+        except Exception as e:
+            logger.error("Error recording the matches of paper %s: %s", paper_id, e)
+            return
+        logger.info("Paper %s matches %d saved profiles", paper_id, len(matched_users))
+
+    async def run_job(self, job: dict, queue: IngestionQueue) -> Dict:
+        """
+        Extract, analyze and store the PDF of an ingestion job, skipping the stages
+        an earlier attempt finished. A failed job removes everything it stored, and
+        so does a job whose paper turns out to duplicate a stored one.
+        """
+        paper_id = job["paper_id"]
+        db = Database.get_db()
+        try:
+            if job["stages"]["extract"]["status"] == "done":
+                text = (await db.paper_contents.find_one({"_id": paper_id}))["content"]
+            else:
+                async with queue.stage(job, "extract"):
+                    grid_out = await Database.get_fs().open_download_stream_by_name(paper_id)
+                    text = await self.extractor.extract_chunks(grid_out, grid_out.length)
+                    if not text:
+                        raise ValueError("Failed to extract text from PDF")
+                    await db.paper_contents.replace_one({"_id": paper_id}, {"_id": paper_id, "content": text}, upsert=True)
+
+            hashes = {"content_sha256": job["content_sha256"], "text_sha256": text_hash(text)}
+            # An earlier attempt may have stored this very paper already
+            existing = await self.find_duplicate(**hashes, exclude_id=paper_id)
+
+            if existing is None:
+                analysis = job.get("analysis")
+                if job["stages"]["analyze"]["status"] != "done":
+                    async with queue.stage(job, "analyze"):
+                        analysis = await self.ai_client().analyze_paper(text)
+                        await queue.update(job["_id"], {"analysis": analysis})
+
+                try:
+                    async with queue.stage(job, "store"):
+                        await self.store_paper(paper_id, job["filename"], analysis, hashes)
+                except DuplicateKeyError:
+                    existing = await self.find_duplicate(**hashes, exclude_id=paper_id)
+        except Exception:
+            await self.discard_paper(paper_id)
+            raise
+
+        if existing is not None:
+            await self.discard_paper(paper_id)
+            return {"paper_id": existing["_id"], "message": f"Duplicate of {existing['title']}", "duplicate": True}
+        return {"message": "Paper successfully processed"}
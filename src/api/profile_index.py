@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+from src.core.percolator import ProfilePercolator
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class SavedProfileIndex:
+    """
+    Keeps a worker's ProfilePercolator in line with the saved user profiles.
+
+    Saves and deletes bump a version counter stored in the catalog_meta collection
+    (the "profiles" document). Each worker checks that counter on every catalog sync
+    tick and reloads its percolator when another worker moved it.
+    """
+
+    def __init__(self, percolator: ProfilePercolator):
+        self.percolator = percolator
+        self.version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def _read_version(self) -> int:
+        meta = await Database.get_db().catalog_meta.find_one({"_id": "profiles"})
+        return meta["version"] if meta else 0
+
+    async def _bump_version(self) -> None:
+        meta = await Database.get_db().catalog_meta.find_one_and_update(
+            {"_id": "profiles"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # No other worker changed the profiles in between, so this worker is in sync at the new version
+        if self.version is not None and meta["version"] == self.version + 1:
+            self.version = meta["version"]
+
+    async def sync(self, force: bool = False) -> None:
+        """Reload every saved profile into the percolator if the stored version changed."""
+        async with self._lock:
+            version = await self._read_version()
+            if not force and version == self.version:
+                return
+            # Read directly so that a failed read leaves the percolator as it was
+            saved = await Database.get_db().user_profiles.find(
+                {}, {"_id": 0, "username": 1, "profile": 1}
+            ).to_list(length=None)
+            # Rebuilt apart, so matching uses the old index until the new one is complete
+            rebuilt = ProfilePercolator()
+            skipped = sum(not rebuilt.add_profile(profile["username"], profile.get("profile")) for profile in saved)
+            self.percolator.replace(rebuilt)
+            self.version = version
+            logger.info("Percolator at profiles version %d with %d profiles (%d skipped)",
+                        version, len(self.percolator), skipped)
+
+    async def profile_saved(self, username: str, profile: Dict) -> None:
+        """Index a profile this worker just saved and record the change for every worker."""
+        async with self._lock:
+            self.percolator.add_profile(username, profile)
+            await self._bump_version()
+
+    async def profile_removed(self, username: str) -> None:
+        """Drop a profile this worker just deleted and record the change for every worker."""
+        async with self._lock:
+            self.percolator.remove_profile(username)
+            await self._bump_version()
@@ -1,200 +1,356 @@
-from typing import Dict, List, Union, Set
+import hashlib
+import json
+import re
+from typing import Any, Dict, FrozenSet, List, Optional
+
+# Section of the customer profile each matchable field lives in
+FIELD_SECTIONS = {
+    'age': 'physical',
+    'weight': 'physical',
+    'sex': 'physical',
+    'height': 'physical',
+    'race': 'demographics',
+    'location': 'demographics',
+    'preexisting_conditions': 'medical_history',
+    'prior_conditions': 'medical_history',
+    'surgeries': 'medical_history',
+    'active_medications': 'medical_history',
+    'athleticism': 'lifestyle',
+    'diet': 'lifestyle',
+}
+
+# Characteristics the ideal profile gives as [min, max] ranges
+NUMERIC_FIELDS = {'age', 'weight', 'height'}
+LIST_FIELDS = {'preexisting_conditions', 'prior_conditions', 'surgeries', 'active_medications'}
+
+_TOKEN_PATTERN = re.compile(r'\(|\)|[^\s()]+')
+
+
+def get_nested_value(d: Dict, key: str):
+    """Look up a characteristic either at the top level or inside one of the profile sections."""
+    if key in d:
+        return d[key]
+
+    section = FIELD_SECTIONS.get(key)
+    if section and isinstance(d.get(section), dict):
+        if key in d[section]:
+            return d[section][key]
+        # For medical_history, a missing list means no entries
+        if key in LIST_FIELDS:
+            return d[section].get(key, [])
+    return None
+
+
+def normalize_value(value: Any) -> Any:
+    """
+    Clean a categorical ideal profile value of the noise LLM output tends to carry (case,
+    surrounding whitespace, spaces or dashes instead of underscores). Non-strings are kept.
+    """
+    if not isinstance(value, str):
+        return value
+    return re.sub(r'[\s\-]+', '_', value.strip().lower())
+
+
+def _as_value_set(value: Any) -> FrozenSet:
+    """Turn an ideal profile value into a set of normalized accepted values, ignoring unhashable entries."""
+    items = value if isinstance(value, (list, set, tuple)) else [value]
+    return frozenset(normalize_value(item) for item in items if isinstance(item, (str, int, float, bool)))
+
+
+class Literal:
+    """A constant sub-condition (a literal True/False or a condition that can never hold)."""
+
+    def __init__(self, value: bool):
+        self.value = value
+
+    def evaluate(self, profile: Dict) -> bool:
+        return self.value
+
+    def explain(self, profile: Dict) -> Dict:
+        return {"literal": self.value, "result": self.value}
+
+    def __repr__(self) -> str:
+        return 'True' if self.value else 'False'
+
+
+class Leaf:
+    """
+    A single characteristic compared against the value(s) from the paper's ideal profile.
+
+    kind is one of:
+        'any'     - the ideal profile leaves the characteristic empty, so any value is accepted
+        'range'   - the profile value must fall within [low, high]
+        'member'  - the (scalar) profile value must be one of the accepted values
+        'overlap' - the (list) profile value must share at least one entry with the accepted values
+    """
+
+    def __init__(self, field: str, kind: str, values: FrozenSet = frozenset(),
+                 low: Optional[float] = None, high: Optional[float] = None):
+        self.field = field
+        self.section = FIELD_SECTIONS[field]
+        self.kind = kind
+        self.values = values
+        self.low = low
+        self.high = high
+
+    def evaluate(self, profile: Dict) -> bool:
+        section = profile.get(self.section)
+        value = section.get(self.field) if isinstance(section, dict) else None
+        if value is None:
+            return False
+        if self.kind == 'any':
+            return True
+        if self.kind == 'range':
+            return self.low <= value <= self.high
+        if self.kind == 'overlap':
+            return not self.values.isdisjoint(value)
+        return value in self.values
+
+    def explain(self, profile: Dict) -> Dict:
+        section = profile.get(self.section)
+        trace = {
+            "field": self.field,
+            "kind": self.kind,
+            "profile_value": section.get(self.field) if isinstance(section, dict) else None,
+        }
+        if self.kind == 'range':
+            trace["ideal_value"] = [self.low, self.high]
+        elif self.kind != 'any':
+            trace["ideal_value"] = sorted(self.values, key=str)
+        trace["result"] = self.evaluate(profile)
+        return trace
+
+    def __repr__(self) -> str:
+        if self.kind == 'range':
+            return f"{self.field}[{self.low}, {self.high}]"
+        if self.kind == 'any':
+            return f"{self.field}[*]"
+        return f"{self.field}{sorted(self.values, key=str)}"
+
+
+class And:
+    def __init__(self, children: List):
+        self.children = children
+
+    def evaluate(self, profile: Dict) -> bool:
+        for child in self.children:
+            if not child.evaluate(profile):
+                return False
+        return True
+
+    def explain(self, profile: Dict) -> Dict:
+        children = [child.explain(profile) for child in self.children]
+        return {"operator": "AND", "result": all(c["result"] for c in children), "children": children}
+
+    def __repr__(self) -> str:
+        return '(' + ' AND '.join(repr(c) for c in self.children) + ')'
+
+
+class Or:
+    def __init__(self, children: List):
+        self.children = children
+
+    def evaluate(self, profile: Dict) -> bool:
+        for child in self.children:
+            if child.evaluate(profile):
+                return True
+        return False
+
+    def explain(self, profile: Dict) -> Dict:
+        children = [child.explain(profile) for child in self.children]
+        return {"operator": "OR", "result": any(c["result"] for c in children), "children": children}
+
+    def __repr__(self) -> str:
+        return '(' + ' OR '.join(repr(c) for c in self.children) + ')'
+
+
+class CompiledCondition:
+    """
+    A paper's condition string bound to its ideal profile, ready to be evaluated
+    against any number of customer profiles without re-parsing.
+    """
+
+    def __init__(self, source: str, root, key: str):
+        self.source = source
+        self.root = root
+        self.key = key
+
+    def evaluate(self, profile: Dict) -> bool:
+        return self.root.evaluate(profile)
+
+    def explain(self, profile: Dict) -> Dict:
+        """
+        Evaluate without short-circuiting and return a trace of every sub-condition:
+        its result and, for single characteristics, the values that were compared.
+        """
+        return {"conditions": self.source, "trace": self.root.explain(profile)}
+
+    def __repr__(self) -> str:
+        return f"CompiledCondition({self.root!r})"
+
 
 class ConditionParser:
     def __init__(self):
         self.operators = {'AND', 'OR'}
-        
+
+    @staticmethod
+    def condition_hash(conditions: Optional[str], ideal_profile: Dict) -> str:
+        """Stable hash of a condition string together with the ideal profile it refers to."""
+        payload = json.dumps([conditions or '', ideal_profile], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
     def parse_conditions(self, conditions: str, profile: Dict, ideal_profile: Dict) -> bool:
         """
         Parse and evaluate conditions against a profile.
-        
+
         Args:
             conditions: String representing the condition logic (e.g., "(Race OR Age) AND preexisting_conditions")
             profile: Dictionary containing the actual profile characteristics
             ideal_profile: Dictionary containing the desired characteristics
-            
+
         Returns:
             bool: True if profile matches conditions, False otherwise
         """
+        return self.compile(conditions, ideal_profile).evaluate(profile)
+
+    def compile(self, conditions: Optional[str], ideal_profile: Dict) -> CompiledCondition:
+        """
+        Compile a condition string and the paper's ideal profile into a reusable evaluator.
+
+        AND binds tighter than OR, both short-circuit, and the ideal profile values are
+        resolved once here rather than on every evaluation.
+
+        Args:
+            conditions: String representing the condition logic
+            ideal_profile: Dictionary containing the desired characteristics
+
+        Returns:
+            CompiledCondition: evaluator for customer profiles
+        """
+        key = self.condition_hash(conditions, ideal_profile)
+
         # Handle empty or None conditions
-        if not conditions:
-            return True
-            
-        # Strip any extra quotes from the conditions string
-        conditions = conditions.strip('"\'')
-        
-        # Remove extra whitespace and parentheses
-        conditions = conditions.strip()
-        
-        # If there are no parentheses but there are operators, treat as simple expression
-        if '(' not in conditions and any(op in conditions.upper() for op in self.operators):
-            return self._evaluate_simple_expression(conditions, profile, ideal_profile)
-            
-        # Handle simple single condition
-        if conditions.upper() not in self.operators and '(' not in conditions:
-            return self._evaluate_single_condition(conditions, profile, ideal_profile)
-            
-        # Handle compound conditions
-        return self._evaluate_compound_conditions(conditions, profile, ideal_profile)
-    
-    def _evaluate_single_condition(self, condition: str, profile: Dict, ideal_profile: Dict) -> bool:
+        source = (conditions or '').strip().strip('"\'').strip()
+        if not source:
+            return CompiledCondition(source, Literal(True), key)
+
+        tokens = _TOKEN_PATTERN.findall(source)
+        position = 0
+
+        def peek() -> Optional[str]:
+            return tokens[position] if position < len(tokens) else None
+
+        def parse_or():
+            nonlocal position
+            children = [parse_and()]
+            while peek() is not None and peek().upper() == 'OR':
+                position += 1
+                children.append(parse_and())
+            return self._combine(Or, children)
+
+        def parse_and():
+            nonlocal position
+            children = [parse_operand()]
+            while peek() is not None and peek().upper() == 'AND':
+                position += 1
+                children.append(parse_operand())
+            return self._combine(And, children)
+
+        def parse_operand():
+            nonlocal position
+            token = peek()
+            if token is None or token == ')' or token.upper() in self.operators:
+                # Missing operand
+                return Literal(False)
+            if token == '(':
+                position += 1
+                node = parse_or()
+                # Tolerate a missing closing parenthesis at the end of the string
+                if peek() == ')':
+                    position += 1
+                return node
+            # Adjacent bare words form one name, e.g. "preexisting conditions"
+            words = []
+            while peek() is not None and peek() not in ('(', ')') and peek().upper() not in self.operators:
+                words.append(peek())
+                position += 1
+            return self._compile_leaf('_'.join(words), ideal_profile)
+
+        root = parse_or()
+        # Ignore stray closing parentheses and keep parsing whatever follows them
+        while position < len(tokens):
+            if peek() == ')':
+                position += 1
+                continue
+            operator = peek().upper()
+            if operator in self.operators:
+                position += 1
+            rest = parse_or()
+            root = self._combine(Or if operator == 'OR' else And, [root, rest])
+
+        return CompiledCondition(source, root, key)
+
+    @staticmethod
+    def _combine(node_type, children: List):
+        """Build an AND/OR node, folding constants and flattening nested nodes of the same type."""
+        absorbing = node_type is Or
+        flat = []
+        for child in children:
+            if isinstance(child, Literal):
+                if child.value == absorbing:
+                    return Literal(absorbing)
+                continue
+            if isinstance(child, node_type):
+                flat.extend(child.children)
+            else:
+                flat.append(child)
+        if not flat:
+            return Literal(not absorbing)
+        if len(flat) == 1:
+            return flat[0]
+        return node_type(flat)
+
+    def _compile_leaf(self, condition: str, ideal_profile: Dict):
         """
-        Evaluate a single condition against profile characteristics.
-        
+        Compile a single condition against the ideal profile.
+
         Args:
             condition: String representing a single characteristic to check
-            profile: Dictionary containing the actual profile characteristics
             ideal_profile: Dictionary containing the desired characteristics
-            
+
         Returns:
-            bool: True if condition is met, False otherwise
+            A Literal or Leaf node
         """
-        condition = condition.strip()
-        print(f"\nEvaluating single condition: {condition}")
-        
         # Handle literal boolean values
         if condition.lower() == 'true':
-            return True
+            return Literal(True)
         if condition.lower() == 'false':
-            return False
-        
-        # Get nested value if it exists
-        def get_nested_value(d: Dict, key: str):
-            # First try direct access
-            if key in d:
-                return d[key]
-            
-            # Then try each section
-            for section in ['physical', 'demographics', 'medical_history', 'lifestyle']:
-                if section in d:
-                    if isinstance(d[section], dict):
-                        if key in d[section]:
-                            return d[section][key]
-                        # For medical_history, check lists
-                        if section == 'medical_history' and key in ['preexisting_conditions', 'prior_conditions', 'surgeries', 'active_medications']:
-                            return d[section].get(key, [])
-            return None
-        
-        profile_value = get_nested_value(profile, condition)
+            return Literal(False)
+
+        # Names that are not profile characteristics can never be satisfied
+        if condition not in FIELD_SECTIONS:
+            return Literal(False)
+
         ideal_value = get_nested_value(ideal_profile, condition)
-        
-        print(f"Profile value: {profile_value}")
-        print(f"Ideal value: {ideal_value}")
-        
-        if profile_value is None or ideal_value is None:
-            print(f"One of the values is None")
-            return False
-            
-        # Handle age ranges
-        if condition == 'age' and isinstance(ideal_value, list) and len(ideal_value) == 2:
-            result = ideal_value[0] <= profile_value <= ideal_value[1]
-            print(f"Age range check: {ideal_value[0]} <= {profile_value} <= {ideal_value[1]} = {result}")
-            return result
-            
-        # Handle list/set type values (e.g., preexisting_conditions)
-        if isinstance(profile_value, (list, set)) and isinstance(ideal_value, (list, set)):
-            if not ideal_value:  # If ideal value is empty list, accept any value
-                print("Empty ideal list - accepting any value")
-                return True
-            
-            # Convert both to sets for intersection
-            profile_set = set(profile_value)
-            ideal_set = set(ideal_value)
-            
-            # Normal set intersection
-            result = bool(profile_set & ideal_set)
-            print(f"Set intersection: {profile_set} & {ideal_set} = {result}")
-            return result
-            
+        if ideal_value is None:
+            return Literal(False)
+
         # Handle empty constraints
-        if isinstance(ideal_value, list) and not ideal_value:
-            print("Empty constraint - accepting any value")
-            return True
-            
-        # Handle single value comparison
-        result = profile_value == ideal_value
-        print(f"Direct comparison: {profile_value} == {ideal_value} = {result}")
-        return result
-    
-    def _evaluate_compound_conditions(self, conditions: str, profile: Dict, ideal_profile: Dict) -> bool:
-        """
-        Evaluate compound conditions with AND/OR operators.
-        """
-        print(f"\nEvaluating conditions: {conditions}")
-        
-        # Handle parentheses groups
-        while '(' in conditions:
-            innermost = self._find_innermost_parentheses(conditions)
-            if not innermost:
-                break
-                
-            result = self._evaluate_simple_expression(innermost, profile, ideal_profile)
-            print(f"Evaluated ({innermost}) = {result}")
-            # Replace the parenthetical expression with its boolean result
-            conditions = conditions.replace(f"({innermost})", "True" if result else "False")
-            print(f"Updated conditions: {conditions}")
-            
-        return self._evaluate_simple_expression(conditions, profile, ideal_profile)
-    
-    def _find_innermost_parentheses(self, expression: str) -> str:
-        """
-        Find the contents of the innermost parentheses in an expression.
-        
-        Args:
-            expression: String containing nested parentheses
-            
-        Returns:
-            str: Contents of innermost parentheses
-        """
-        start = expression.rfind('(')
-        if start == -1:
-            return ''
-            
-        end = expression.find(')', start)
-        if end == -1:
-            return ''
-            
-        return expression[start + 1:end]
-    
-    def _evaluate_simple_expression(self, expression: str, profile: Dict, ideal_profile: Dict) -> bool:
-        """
-        Evaluate a simple expression without parentheses.
-        """
-        expression = expression.strip()
-        
-        parts = expression.split()
-        
-        # Process OR conditions
-        if 'OR' in parts:
-            conditions = [p for p in parts if p != 'OR']
-            results = []
-            for cond in conditions:
-                if cond.lower() == 'true':
-                    results.append(True)
-                elif cond.lower() == 'false':
-                    results.append(False)
-                else:
-                    results.append(self._evaluate_single_condition(cond, profile, ideal_profile))
-            return any(results)
-        
-        # Process AND conditions
-        if 'AND' in parts:
-            conditions = [p for p in parts if p != 'AND']
-            results = []
-            for cond in conditions:
-                if cond.lower() == 'true':
-                    results.append(True)
-                elif cond.lower() == 'false':
-                    results.append(False)
-                else:
-                    results.append(self._evaluate_single_condition(cond, profile, ideal_profile))
-            return all(results)
-        
-        # Single condition or boolean literal
-        if expression.lower() == 'true':
-            return True
-        if expression.lower() == 'false':
-            return False
-            
-        # Single condition
-        return self._evaluate_single_condition(expression, profile, ideal_profile)
+        if isinstance(ideal_value, (list, set, tuple)) and not ideal_value:
+            return Leaf(condition, 'any')
+
+        # Handle age, weight and height ranges
+        if condition in NUMERIC_FIELDS:
+            if isinstance(ideal_value, (list, tuple)) and len(ideal_value) == 2:
+                try:
+                    low, high = float(ideal_value[0]), float(ideal_value[1])
+                except (TypeError, ValueError):
+                    return Literal(False)
+                return Leaf(condition, 'range', low=low, high=high)
+            return Literal(False)
+
+        # Handle list type values (e.g., preexisting_conditions)
+        if condition in LIST_FIELDS:
+            return Leaf(condition, 'overlap', values=_as_value_set(ideal_value))
+
+        return Leaf(condition, 'member', values=_as_value_set(ideal_value))
@@ -0,0 +1,88 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Node:
+    """Node of a centered interval tree."""
+
+    def __init__(self, center: float, intervals: List[Tuple[float, float, Any]],
+                 left: Optional['_Node'], right: Optional['_Node']):
+        self.center = center
+        # Intervals containing the center, sorted by low ascending and by high descending
+        self.by_low = sorted(intervals, key=lambda interval: interval[0])
+        self.by_high = sorted(intervals, key=lambda interval: interval[1], reverse=True)
+        self.left = left
+        self.right = right
+
+
+class IntervalIndex:
+    """
+    Stabbing-query index over closed [low, high] intervals.
+
+    Intervals are added and removed through handles; the centered interval tree is
+    rebuilt on the first query after a change, and each query then runs in
+    O(log n + k) for k matching intervals.
+    """
+
+    def __init__(self):
+        self._intervals: Dict[int, Tuple[float, float, Any]] = {}
+        self._next_handle = 0
+        self._root: Optional[_Node] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, low: float, high: float, item: Any) -> int:
+        """Add an interval carrying item and return a handle for removing it."""
+        handle = self._next_handle
+        self._next_handle += 1
+        self._intervals[handle] = (low, high, item)
+        self._dirty = True
+        return handle
+
+    def remove(self, handle: int) -> None:
+        if self._intervals.pop(handle, None) is not None:
+            self._dirty = True
+
+    def stab(self, point: float) -> List[Any]:
+        """Items of every interval with low <= point <= high."""
+        if self._dirty:
+            self._root = self._build(list(self._intervals.values()))
+            self._dirty = False
+
+        items = []
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for low, high, item in node.by_low:
+                    if low > point:
+                        break
+                    items.append(item)
+                node = node.left
+            elif point > node.center:
+                for low, high, item in node.by_high:
+                    if high < point:
+                        break
+                    items.append(item)
+                node = node.right
+            else:
+                items.extend(item for low, high, item in node.by_low)
+                break
+        return items
+
+    def _build(self, intervals: List[Tuple[float, float, Any]]) -> Optional[_Node]:
+        if not intervals:
+            return None
+
+        endpoints = sorted(value for low, high, _ in intervals for value in (low, high))
+        center = endpoints[len(endpoints) // 2]
+
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+        return _Node(center, overlapping, self._build(left), self._build(right))
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.core.condition_parser import LIST_FIELDS
+
+
+def profile_hash(profile: Dict) -> str:
+    """
+    Canonical hash of a profile dict: enum values as strings and list fields sorted,
+    so equivalent profiles share cache entries.
+    """
+    canonical = {}
+    for section, values in profile.items():
+        if not isinstance(values, dict):
+            continue
+        canonical[section] = {}
+        for field, value in values.items():
+            if field in LIST_FIELDS:
+                canonical[section][field] = sorted(str(getattr(item, 'value', item)) for item in value or [])
+            else:
+                canonical[section][field] = getattr(value, 'value', value)
+    payload = json.dumps(canonical, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MatchCache:
+    """Bounded cache of match results. Subclasses provide the storage."""
+
+    backend = "none"
+    # Whether the storage does blocking I/O, which async callers must keep off the event loop
+    blocking = False
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict) -> None:
+        self._set(key, value)
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        """get() for the event loop: blocking storage is read in a thread."""
+        if not self.blocking:
+            return self.get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    async def set_async(self, key: str, value: Dict) -> None:
+        """set() for the event loop: blocking storage is written in a thread."""
+        if not self.blocking:
+            return self.set(key, value)
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, value)
+
+    async def stats_async(self) -> Dict:
+        """stats() for the event loop: blocking storage is counted in a thread."""
+        if not self.blocking:
+            return self.stats()
+        return await asyncio.get_running_loop().run_in_executor(None, self.stats)
+
+    def clear(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "size": len(self),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _get(self, key: str) -> Optional[Dict]:
+        return None
+
+    def _set(self, key: str, value: Dict) -> None:
+        pass
+
+
+class InProcessMatchCache(MatchCache):
+    """LRU cache held in the worker's memory."""
+
+    backend = "memory"
+
+    def __init__(self, max_size: int = 1024):
+        super().__init__(max_size)
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: Dict) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteMatchCache(MatchCache):
+    """
+    LRU cache in a local SQLite file, shared by every worker on the machine.
+    Hit and miss counts are per worker.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_size: int = 1024):
+        super().__init__(max_size)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS match_cache (key TEXT PRIMARY KEY, value TEXT, accessed REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS match_cache_accessed ON match_cache (accessed)")
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM match_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE match_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO match_cache (key, value, accessed) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            self._connection.execute(
+                "DELETE FROM match_cache WHERE key IN "
+                "(SELECT key FROM match_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM match_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM match_cache").fetchone()[0]
+
+
+def create_match_cache() -> MatchCache:
+    """
+    Build the match cache configured through the environment:
+    MATCH_CACHE_BACKEND (memory, sqlite or none), MATCH_CACHE_SIZE and MATCH_CACHE_PATH.
+    """
+    backend = os.getenv("MATCH_CACHE_BACKEND", "memory")
+    max_size = int(os.getenv("MATCH_CACHE_SIZE", "1024"))
+    if backend == "sqlite":
+        return SQLiteMatchCache(os.getenv("MATCH_CACHE_PATH", "data/match_cache.sqlite3"), max_size)
+    if backend == "none":
+        return MatchCache(max_size)
+    return InProcessMatchCache(max_size)
@@ -0,0 +1,315 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.condition_parser import And, Or, Leaf, Literal, CompiledCondition, FIELD_SECTIONS, LIST_FIELDS, NUMERIC_FIELDS
+from src.models.profile import (
+    Sex, Race, Continent, Athleticism, Diet,
+    PreexistingCondition, PriorCondition, Surgery, Medication
+)
+
+# Enum behind each categorical field; every value gets one bit of an int64 mask
+ENUM_FIELDS = {
+    'sex': Sex,
+    'race': Race,
+    'location': Continent,
+    'athleticism': Athleticism,
+    'diet': Diet,
+    'preexisting_conditions': PreexistingCondition,
+    'prior_conditions': PriorCondition,
+    'surgeries': Surgery,
+    'active_medications': Medication,
+}
+
+BIT_VALUES = {
+    field: {member.value: 1 << i for i, member in enumerate(enum)}
+    for field, enum in ENUM_FIELDS.items()
+}
+
+# Number of set bits for every possible enum mask
+POPCOUNT = np.array([bin(i).count('1') for i in range(1 << max(len(enum) for enum in ENUM_FIELDS.values()))])
+
+# Weights of the relevance score components, which are each in [0, 1]
+SCORE_WEIGHTS = {
+    'conditions': 0.5,  # share of the paper's sub-conditions the profile satisfies
+    'overlap': 0.3,     # share of the paper's medical history entries the profile shares
+    'age': 0.2,         # how close the profile's age is to the middle of the paper's age range
+}
+
+
+def iter_leaves(node):
+    """Yield every Leaf in a compiled condition tree."""
+    if isinstance(node, Leaf):
+        yield node
+    elif isinstance(node, (And, Or)):
+        for child in node.children:
+            yield from iter_leaves(child)
+
+
+def condition_shape(node):
+    """
+    The structure of a condition tree with each leaf reduced to its field name.
+
+    Papers whose conditions share a shape are evaluated together, since their leaves
+    only differ in the ideal values stored in the columns.
+    """
+    if isinstance(node, Leaf):
+        return node.field
+    if isinstance(node, Literal):
+        return node.value
+    return ('and' if isinstance(node, And) else 'or', tuple(condition_shape(c) for c in node.children))
+
+
+def shape_fields(shape) -> List[str]:
+    """Field of every leaf in a condition shape, with repeats."""
+    if isinstance(shape, str):
+        return [shape]
+    if isinstance(shape, bool):
+        return []
+    return [field for child in shape[1] for field in shape_fields(child)]
+
+
+def encode_value_mask(field: str, value) -> int:
+    """Bitmask of a profile's value (or list of values) for a categorical field."""
+    bits = BIT_VALUES[field]
+    if isinstance(value, (list, set, tuple)):
+        mask = 0
+        for item in value:
+            mask |= bits.get(getattr(item, 'value', item), 0)
+        return mask
+    return bits.get(getattr(value, 'value', value), 0)
+
+
+class MatchEngine:
+    """
+    Columnar store of compiled paper conditions.
+
+    Every paper is a row. Categorical fields are stored as int64 masks of the accepted
+    values plus an "any value" flag, and the numeric fields as low/high columns, so a
+    profile is checked against the whole catalog with a few array operations per field.
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._conditions: List[CompiledCondition] = []
+        self._dirty = True
+        self._masks: Dict[str, np.ndarray] = {}
+        self._accept_any: Dict[str, np.ndarray] = {}
+        self._lows: Dict[str, np.ndarray] = {}
+        self._highs: Dict[str, np.ndarray] = {}
+        self._shapes: List = []
+        self._shape_fields: List[List[str]] = []
+        self._shape_of_row = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, paper_id: str) -> bool:
+        return paper_id in self._rows
+
+    def paper_ids(self) -> List[str]:
+        return list(self._ids)
+
+    def rows_for(self, paper_ids: Iterable[str]) -> np.ndarray:
+        """Row numbers of the given papers, skipping ids not in the catalog."""
+        rows = [self._rows[paper_id] for paper_id in paper_ids if paper_id in self._rows]
+        return np.array(rows, dtype=np.int64)
+
+    def add_paper(self, paper_id: str, compiled: CompiledCondition) -> None:
+        """Add a paper's compiled conditions, replacing any previous entry for the same id."""
+        row = self._rows.get(paper_id)
+        if row is None:
+            self._rows[paper_id] = len(self._ids)
+            self._ids.append(paper_id)
+            self._conditions.append(compiled)
+        else:
+            self._conditions[row] = compiled
+        self._dirty = True
+
+    def remove_paper(self, paper_id: str) -> None:
+        """Remove a paper, moving the last row into its place."""
+        row = self._rows.pop(paper_id, None)
+        if row is None:
+            return
+        last_id = self._ids.pop()
+        last_condition = self._conditions.pop()
+        if last_id != paper_id:
+            self._ids[row] = last_id
+            self._conditions[row] = last_condition
+            self._rows[last_id] = row
+        self._dirty = True
+
+    def _build(self) -> None:
+        """Rebuild the column arrays from the compiled conditions."""
+        n = len(self._ids)
+        self._masks = {field: np.zeros(n, dtype=np.int64) for field in ENUM_FIELDS}
+        self._accept_any = {field: np.zeros(n, dtype=bool) for field in FIELD_SECTIONS}
+        self._lows = {field: np.full(n, np.inf) for field in NUMERIC_FIELDS}
+        self._highs = {field: np.full(n, -np.inf) for field in NUMERIC_FIELDS}
+
+        shape_index: Dict = {}
+        shape_of_row = np.zeros(n, dtype=np.int64)
+        for row, compiled in enumerate(self._conditions):
+            for leaf in iter_leaves(compiled.root):
+                if leaf.kind == 'any':
+                    self._accept_any[leaf.field][row] = True
+                elif leaf.kind == 'range':
+                    self._lows[leaf.field][row] = leaf.low
+                    self._highs[leaf.field][row] = leaf.high
+                else:
+                    self._masks[leaf.field][row] = encode_value_mask(leaf.field, list(leaf.values))
+            shape = condition_shape(compiled.root)
+            shape_of_row[row] = shape_index.setdefault(shape, len(shape_index))
+
+        self._shapes = list(shape_index)
+        self._shape_fields = [shape_fields(shape) for shape in self._shapes]
+        self._shape_of_row = shape_of_row
+        self._dirty = False
+
+    def _leaf_results(self, profile: Dict, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        """Evaluate every field's leaf for the given rows."""
+        results = {}
+        for field, section in FIELD_SECTIONS.items():
+            value = (profile.get(section) or {}).get(field)
+            if value is None:
+                results[field] = np.zeros(len(rows), dtype=bool)
+            elif field in NUMERIC_FIELDS:
+                results[field] = (self._lows[field][rows] <= value) & (value <= self._highs[field][rows])
+                results[field] |= self._accept_any[field][rows]
+            else:
+                mask = encode_value_mask(field, value)
+                results[field] = (self._masks[field][rows] & mask) != 0
+                results[field] |= self._accept_any[field][rows]
+        return results
+
+    def _evaluate_shape(self, shape, leaf_results: Dict[str, np.ndarray], positions: np.ndarray) -> np.ndarray:
+        if isinstance(shape, bool):
+            return np.full(len(positions), shape)
+        if isinstance(shape, str):
+            return leaf_results[shape][positions]
+        operator, children = shape
+        result = self._evaluate_shape(children[0], leaf_results, positions)
+        for child in children[1:]:
+            if operator == 'and':
+                result &= self._evaluate_shape(child, leaf_results, positions)
+            else:
+                result |= self._evaluate_shape(child, leaf_results, positions)
+        return result
+
+    def _evaluate(self, profile: Dict, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Evaluate a profile against the given rows.
+
+        Returns:
+            Whether each row matched, the share of each row's leaves that were
+            satisfied, and the per-field leaf results
+        """
+        leaf_results = self._leaf_results(profile, rows)
+        matched = np.zeros(len(rows), dtype=bool)
+        satisfied = np.ones(len(rows))
+
+        # Group the rows by condition shape and evaluate each shape once
+        shape_ids = self._shape_of_row[rows]
+        order = np.argsort(shape_ids, kind='stable')
+        boundaries = np.flatnonzero(np.diff(shape_ids[order])) + 1
+        for positions in np.split(order, boundaries):
+            shape_id = shape_ids[positions[0]]
+            matched[positions] = self._evaluate_shape(self._shapes[shape_id], leaf_results, positions)
+            fields = self._shape_fields[shape_id]
+            if fields:
+                satisfied[positions] = sum(leaf_results[field][positions] for field in fields) / len(fields)
+        return matched, satisfied, leaf_results
+
+    def _score(self, profile: Dict, rows: np.ndarray, satisfied: np.ndarray) -> np.ndarray:
+        """Relevance of each row to the profile, between 0 and 1."""
+        # Overlap between the profile's and the papers' medical history lists
+        shared = np.zeros(len(rows))
+        listed = np.zeros(len(rows))
+        medical_history = profile.get('medical_history') or {}
+        for field in LIST_FIELDS:
+            masks = self._masks[field][rows]
+            shared += POPCOUNT[masks & encode_value_mask(field, medical_history.get(field) or [])]
+            listed += POPCOUNT[masks]
+        overlap = np.divide(shared, listed, out=np.zeros(len(rows)), where=listed > 0)
+
+        # Distance of the profile's age from the middle of the paper's age range
+        age_fit = np.zeros(len(rows))
+        age = (profile.get('physical') or {}).get('age')
+        if age is not None:
+            low, high = self._lows['age'][rows], self._highs['age'][rows]
+            bounded = np.isfinite(low) & np.isfinite(high) & (low <= age) & (age <= high)
+            half_width = (high - low) / 2
+            with np.errstate(invalid='ignore', divide='ignore'):
+                fit = np.where(half_width > 0, 1 - np.abs(age - (low + high) / 2) / half_width, 1.0)
+            age_fit[bounded] = fit[bounded]
+
+        return (SCORE_WEIGHTS['conditions'] * satisfied
+                + SCORE_WEIGHTS['overlap'] * overlap
+                + SCORE_WEIGHTS['age'] * age_fit)
+
+    def match(self, profile: Dict, rows: Optional[np.ndarray] = None) -> List[str]:
+        """
+        Evaluate a profile against the catalog.
+
+        Args:
+            profile: Dictionary containing profile characteristics (enum values as strings)
+            rows: Optional subset of rows to evaluate; defaults to the whole catalog
+
+        Returns:
+            List of matching paper ids, in catalog order
+        """
+        if self._dirty:
+            self._build()
+        if rows is None:
+            rows = np.arange(len(self._ids))
+        if len(rows) == 0:
+            return []
+
+        matched, _, _ = self._evaluate(profile, rows)
+        return [self._ids[row] for row in np.sort(rows[matched])]
+
+    def rank(self, profile: Dict, rows: Optional[np.ndarray] = None,
+             limit: Optional[int] = None, offset: int = 0) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Score the matching papers and select one page of the best ones.
+
+        Only the matches up to offset + limit are selected (with a partial
+        partition) and sorted; the rest of the match list is never ordered.
+
+        Args:
+            profile: Dictionary containing profile characteristics (enum values as strings)
+            rows: Optional subset of rows to evaluate; defaults to the whole catalog
+            limit: Maximum number of matches to return; None returns all of them
+            offset: Number of best matches to skip
+
+        Returns:
+            (paper_id, score) pairs from best to worst, and the total number of matches
+        """
+        if self._dirty:
+            self._build()
+        if rows is None:
+            rows = np.arange(len(self._ids))
+        if len(rows) == 0:
+            return [], 0
+
+        matched, satisfied, _ = self._evaluate(profile, rows)
+        rows, satisfied = rows[matched], satisfied[matched]
+        total = len(rows)
+        scores = self._score(profile, rows, satisfied)
+
+        end = total if limit is None else min(total, offset + limit)
+        if offset >= end:
+            return [], total
+        if end < total:
+            # Everything scoring above the end-th best score, then ties in catalog order
+            threshold = np.partition(-scores, end - 1)[end - 1]
+            above = np.flatnonzero(-scores < threshold)
+            ties = np.flatnonzero(-scores == threshold)
+            ties = ties[np.argsort(rows[ties], kind='stable')][:end - len(above)]
+            best = np.concatenate([above, ties])
+        else:
+            best = np.arange(total)
+        # Highest score first, ties in catalog order
+        best = best[np.lexsort((rows[best], -scores[best]))][offset:end]
+        return [(self._ids[rows[i]], float(scores[i])) for i in best], total
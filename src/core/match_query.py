@@ -0,0 +1,78 @@
+import math
+from typing import Dict
+
+from src.core.condition_parser import CompiledCondition, FIELD_SECTIONS, LIST_FIELDS, NUMERIC_FIELDS
+from src.core.match_engine import ENUM_FIELDS, BIT_VALUES
+from src.core.paper_index import condition_guards
+
+# Stored in place of the accepted values when a paper's conditions don't require a field
+ANY_VALUE = "*"
+
+# Indexes on the match_fields of paper documents. Every categorical field is an array,
+# so each compound index holds at most one of them next to the scalar numeric bounds.
+MATCH_FIELD_INDEXES = [
+    [("match_fields.sex", 1), ("match_fields.age_min", 1), ("match_fields.age_max", 1)],
+    [("match_fields.weight_min", 1), ("match_fields.weight_max", 1),
+     ("match_fields.height_min", 1), ("match_fields.height_max", 1)],
+] + [[(f"match_fields.{field}", 1)] for field in ENUM_FIELDS if field != 'sex']
+
+
+def match_fields(compiled: CompiledCondition) -> Dict:
+    """
+    Normalized, typed copy of the ideal profile values a paper's conditions require.
+
+    Categorical fields hold arrays of accepted enum values, or [ANY_VALUE] when the
+    conditions don't require the field (it is only reachable through an OR with other
+    fields, or not mentioned at all). Age, weight and height hold <field>_min and
+    <field>_max bounds, infinite when not required. satisfiable is False when the
+    conditions can never hold. A paper can only match profiles that candidate_query
+    selects with these fields.
+    """
+    fields = {field: [ANY_VALUE] for field in ENUM_FIELDS}
+    for field in NUMERIC_FIELDS:
+        fields[f"{field}_min"] = -math.inf
+        fields[f"{field}_max"] = math.inf
+
+    guards = condition_guards(compiled.root)
+    fields["satisfiable"] = all(guards)
+    for guard in guards:
+        if len(guard) != 1:
+            continue
+        leaf = guard[0]
+        if leaf.kind == 'range':
+            fields[f"{leaf.field}_min"] = max(fields[f"{leaf.field}_min"], leaf.low)
+            fields[f"{leaf.field}_max"] = min(fields[f"{leaf.field}_max"], leaf.high)
+            continue
+        # Leaf values are normalized when compiled, so only enum values need keeping
+        accepted = {value for value in leaf.values if value in BIT_VALUES[leaf.field]}
+        if fields[leaf.field] != [ANY_VALUE]:
+            accepted &= set(fields[leaf.field])
+        fields[leaf.field] = sorted(accepted)
+    return fields
+
+
+def candidate_query(profile: Dict) -> Dict:
+    """
+    MongoDB query selecting the papers whose match_fields a profile satisfies,
+    a superset of the papers the profile matches.
+
+    Args:
+        profile: Dictionary containing profile characteristics (enum values as strings)
+
+    Returns:
+        Filter document for the papers collection
+    """
+    query = {"match_fields.satisfiable": True}
+    for field in ENUM_FIELDS:
+        value = (profile.get(FIELD_SECTIONS[field]) or {}).get(field)
+        if value is None:
+            continue
+        values = value if field in LIST_FIELDS else [value]
+        query[f"match_fields.{field}"] = {"$in": [getattr(item, 'value', item) for item in values] + [ANY_VALUE]}
+    for field in sorted(NUMERIC_FIELDS):
+        value = (profile.get(FIELD_SECTIONS[field]) or {}).get(field)
+        if value is None:
+            continue
+        query[f"match_fields.{field}_min"] = {"$lte": value}
+        query[f"match_fields.{field}_max"] = {"$gte": value}
+    return query
@@ -0,0 +1,155 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+from src.core.condition_parser import And, Leaf, Literal, CompiledCondition, FIELD_SECTIONS, LIST_FIELDS, NUMERIC_FIELDS
+from src.core.interval_index import IntervalIndex
+
+
+def is_indexable(leaf: Leaf) -> bool:
+    """Whether the profile values satisfying a leaf can be looked up in the index."""
+    return leaf.kind in ('member', 'overlap', 'range')
+
+
+def condition_guards(node) -> List[List[Leaf]]:
+    """
+    Necessary conditions for a compiled condition tree to hold.
+
+    Returns a list of guards, each a list of leaves: a profile can only satisfy the tree
+    if, for every guard, at least one of its leaves is satisfied. An empty list means the
+    tree can't be pruned, and a guard with no leaves means the tree can never hold.
+    Guards containing leaves that can't be indexed are dropped, which only makes the
+    pruning less strict.
+    """
+    if isinstance(node, Literal):
+        return [] if node.value else [[]]
+    if isinstance(node, Leaf):
+        return [[node]] if is_indexable(node) else []
+    if isinstance(node, And):
+        guards = []
+        for child in node.children:
+            guards.extend(condition_guards(child))
+        return guards
+
+    # OR: one guard per child, merged; any child that can't be pruned makes the OR unprunable
+    merged = []
+    for child in node.children:
+        child_guards = condition_guards(child)
+        if not child_guards:
+            return []
+        merged.extend(min(child_guards, key=len))
+    return [merged]
+
+
+def leaf_keys(leaf: Leaf) -> List[str]:
+    """Posting keys of the profile values that satisfy a leaf, e.g. 'race=asian'."""
+    return [f"{leaf.field}={value}" for value in leaf.values]
+
+
+def profile_keys(profile: Dict) -> List[str]:
+    """Posting keys for every characteristic of a profile."""
+    keys = []
+    for field, section in FIELD_SECTIONS.items():
+        value = (profile.get(section) or {}).get(field)
+        if value is None or field in NUMERIC_FIELDS:
+            continue
+        if field in LIST_FIELDS:
+            keys.extend(f"{field}={getattr(item, 'value', item)}" for item in value)
+        else:
+            keys.append(f"{field}={getattr(value, 'value', value)}")
+    return keys
+
+
+class PaperIndex:
+    """
+    Inverted index from profile attribute values to the papers they could satisfy.
+
+    Every guard of a paper is numbered, and each posting maps a paper id to a bitmask
+    of the guards that the posting's value satisfies. Age, weight and height ranges go
+    into one interval index per field, whose stabbing queries contribute guard bitmasks
+    the same way. A paper is a candidate for a profile once the profile's postings and
+    ranges cover all of its guards. Papers without guards are always candidates, and
+    papers with an unsatisfiable guard never are.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._ranges: Dict[str, IntervalIndex] = {field: IntervalIndex() for field in NUMERIC_FIELDS}
+        self._paper_ranges: Dict[str, List[Tuple[str, int]]] = {}
+        self._required: Dict[str, int] = {}
+        self._paper_keys: Dict[str, Set[str]] = {}
+        self.always: Set[str] = set()
+        self.never: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._required) + len(self.always) + len(self.never)
+
+    def add_paper(self, paper_id: str, compiled: CompiledCondition) -> None:
+        """Index a paper's compiled conditions, replacing any previous entry."""
+        self.remove_paper(paper_id)
+
+        guards = condition_guards(compiled.root)
+        if not guards:
+            self.always.add(paper_id)
+            return
+        if any(not guard for guard in guards):
+            self.never.add(paper_id)
+            return
+
+        keys = set()
+        ranges = []
+        for number, guard in enumerate(guards):
+            for leaf in guard:
+                if leaf.kind == 'range':
+                    # Empty or malformed ranges can never be satisfied, so they get no entry
+                    if leaf.low <= leaf.high:
+                        handle = self._ranges[leaf.field].add(leaf.low, leaf.high, (paper_id, 1 << number))
+                        ranges.append((leaf.field, handle))
+                    continue
+                for key in leaf_keys(leaf):
+                    posting = self._postings.setdefault(key, {})
+                    posting[paper_id] = posting.get(paper_id, 0) | (1 << number)
+                    keys.add(key)
+        self._required[paper_id] = (1 << len(guards)) - 1
+        self._paper_keys[paper_id] = keys
+        self._paper_ranges[paper_id] = ranges
+
+    def remove_paper(self, paper_id: str) -> None:
+        self.always.discard(paper_id)
+        self.never.discard(paper_id)
+        self._required.pop(paper_id, None)
+        for key in self._paper_keys.pop(paper_id, ()):
+            posting = self._postings.get(key)
+            if posting is not None:
+                posting.pop(paper_id, None)
+                if not posting:
+                    del self._postings[key]
+        for field, handle in self._paper_ranges.pop(paper_id, ()):
+            self._ranges[field].remove(handle)
+
+    def candidates(self, profile: Dict) -> Set[str]:
+        """
+        Papers whose conditions could possibly be satisfied by a profile.
+
+        Args:
+            profile: Dictionary containing profile characteristics
+
+        Returns:
+            Set of candidate paper ids
+        """
+        covered = self._cover(profile_keys(profile))
+        for field in NUMERIC_FIELDS:
+            value = (profile.get(FIELD_SECTIONS[field]) or {}).get(field)
+            if value is None:
+                continue
+            for paper_id, mask in self._ranges[field].stab(value):
+                covered[paper_id] = covered.get(paper_id, 0) | mask
+        candidates = {paper_id for paper_id, mask in covered.items() if mask == self._required[paper_id]}
+        candidates |= self.always
+        return candidates
+
+    def _cover(self, keys: Iterable[str]) -> Dict[str, int]:
+        """Combine the guard bitmasks of every posting for the given keys."""
+        covered: Dict[str, int] = {}
+        for key in keys:
+            for paper_id, mask in self._postings.get(key, {}).items():
+                covered[paper_id] = covered.get(paper_id, 0) | mask
+        return covered
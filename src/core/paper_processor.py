@@ -1,17 +1,191 @@
+import asyncio
+import hashlib
+import io
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import AsyncIterable, Awaitable, BinaryIO, Callable, Optional, List, Dict, Tuple, Union
 import PyPDF2
 import tempfile
 
+logger = logging.getLogger(__name__)
+
+def file_sha256(file: BinaryIO, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a binary file object's whole content, read from the start in chunks."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def text_hash(text: str) -> str:
+    """SHA-256 of a paper's text, ignoring case and whitespace, so re-exported PDFs of a paper share it."""
+    return hashlib.sha256(" ".join(text.lower().split()).encode('utf-8')).hexdigest()
+
+def _shared_pdf_reader(name: str, size: int) -> PyPDF2.PdfReader:
+    """Reader of the size-byte PDF in the shared memory block called name."""
+    shared = SharedMemory(name=name)
+    try:
+        data = bytes(shared.buf[:size])
+    finally:
+        shared.close()
+    return PyPDF2.PdfReader(io.BytesIO(data))
+
+def extract_page_texts(name: str, size: int, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Text of pages start..stop of the PDF in a shared memory block."""
+    reader = _shared_pdf_reader(name, size)
+    return [page.extract_text() for page in reader.pages[start:stop]]
+
+def _first_page_texts(name: str, size: int, pages_per_task: int) -> Tuple[int, List[str]]:
+    """Page count of the PDF in a shared memory block and the text of its first pages_per_task pages."""
+    reader = _shared_pdf_reader(name, size)
+    return len(reader.pages), [page.extract_text() for page in reader.pages[:pages_per_task]]
+
+def _copy_file(source: BinaryIO, buffer: memoryview) -> None:
+    """Read a binary file object from the start into buffer."""
+    source.seek(0)
+    offset = 0
+    while offset < len(buffer):
+        with buffer[offset:] as view:
+            read = source.readinto(view)
+        if not read:
+            break
+        offset += read
+
+class PdfExtractor:
+    """
+    Extracts the text of PDFs in a pool of worker processes, so parsing never blocks the event loop.
+
+    PDFs longer than pages_per_task pages are split into page ranges extracted in parallel.
+    Configured through PDF_EXTRACT_WORKERS, PDF_EXTRACT_TIMEOUT (seconds per document)
+    and PDF_PAGES_PER_TASK. When a document times out, the pool is replaced and its
+    workers are killed, so a pathological PDF can't keep a worker busy.
+    """
+
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None,
+                 pages_per_task: Optional[int] = None):
+        self.workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or os.cpu_count()
+        self.timeout = timeout if timeout is not None else float(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+        self.pages_per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", "50"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def _extract(self, pool: ProcessPoolExecutor, name: str, size: int) -> str:
+        loop = asyncio.get_running_loop()
+        page_count, pages = await loop.run_in_executor(pool, _first_page_texts, name, size, self.pages_per_task)
+        if page_count > self.pages_per_task:
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(pool, extract_page_texts, name, size, start, start + self.pages_per_task)
+                for start in range(self.pages_per_task, page_count, self.pages_per_task)
+            ))
+            for chunk in chunks:
+                pages.extend(chunk)
+        return "\n".join(pages).strip()
+
+    def _recycle(self, pool: ProcessPoolExecutor) -> None:
+        """Kill the workers of pool, whose tasks can't be cancelled otherwise, and start a new pool on next use."""
+        if self._pool is pool:
+            self._pool = None
+        # ProcessPoolExecutor has no public way to stop a running task
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        pool.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+
+    async def extract(self, source: Union[bytes, BinaryIO]) -> Optional[str]:
+        """
+        Extract the text of a PDF given as bytes or as a binary file object, such as
+        an upload's spooled file, which is read into shared memory in a thread.
+
+        Returns:
+            str: Extracted text, or None if extraction fails or takes longer than the timeout
+        """
+        if isinstance(source, bytes):
+            async def fill(buffer: memoryview) -> None:
+                buffer[:len(source)] = source
+            return await self._extract_shared(len(source), fill)
+
+        size = source.seek(0, os.SEEK_END)
+        async def fill(buffer: memoryview) -> None:
+            await asyncio.get_running_loop().run_in_executor(None, _copy_file, source, buffer)
+        return await self._extract_shared(size, fill)
+
+    async def extract_chunks(self, chunks: AsyncIterable[bytes], size: int) -> Optional[str]:
+        """
+        Extract the text of a size-byte PDF streamed in chunks, such as a GridFS download.
+        Each chunk is copied into shared memory as it arrives, so the PDF is never held twice.
+        """
+        async def fill(buffer: memoryview) -> None:
+            offset = 0
+            async for chunk in chunks:
+                buffer[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+        return await self._extract_shared(size, fill)
+
+    async def _extract_shared(self, size: int, fill: Callable[[memoryview], Awaitable[None]]) -> Optional[str]:
+        """
+        Extract the text of a size-byte PDF that fill writes into a shared memory block.
+
+        The worker processes read the PDF from that block, so its bytes are neither
+        copied into every task nor written to disk. An extraction whose workers were
+        killed by another one's timeout is retried once.
+        """
+        shared = None
+        try:
+            shared = SharedMemory(create=True, size=max(size, 1))
+            await fill(shared.buf)
+            for attempt in range(2):
+                pool = self.pool
+                # Not cancelled on timeout: killing the workers fails its executor futures instead
+                task = asyncio.ensure_future(self._extract(pool, shared.name, size))
+                try:
+                    done, _ = await asyncio.wait({task}, timeout=self.timeout)
+                except asyncio.CancelledError:
+                    # The shared memory is about to be released, so the extraction can't outlive the caller
+                    task.cancel()
+                    raise
+                if not done:
+                    task.add_done_callback(lambda finished: finished.exception())
+                    logger.error("PDF text extraction timed out after %ss", self.timeout)
+                    self._recycle(pool)
+                    return None
+                try:
+                    return task.result()
+                except BrokenProcessPool:
+                    if attempt:
+                        raise
+        except Exception as e:
+            logger.error("Error extracting PDF text: %s", e)
+            return None
+        finally:
+            if shared is not None:
+                shared.close()
+                shared.unlink()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
 class PaperProcessor:
-    def __init__(self, papers_dir: str = "data/papers/raw"):
+    def __init__(self, papers_dir: str = "data/papers/raw", save_text: bool = False):
         self.papers_dir = Path(papers_dir)
         self.temp_dir = Path("data/papers/text")
+        # Whether extracted text is also written to a text file in temp_dir
+        self.save_text = save_text
         if not self.papers_dir.exists():
             raise FileNotFoundError(f"Papers directory not found: {papers_dir}")
         # Create temp directory if it doesn't exist
-        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        if self.save_text:
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
 
     def get_unprocessed_papers(self) -> List[str]:
         """
@@ -32,7 +206,7 @@ class PaperProcessor:
 
     def extract_text_from_pdf(self, filename: str) -> Optional[str]:
         """
-        Extract text from a PDF file and save to temporary text file.
+        Extract text from a PDF file, saving it to a temporary text file if save_text is set.
         
         Args:
             filename: Name of the PDF file (e.g., 'P1.pdf')
@@ -48,14 +222,13 @@ class PaperProcessor:
         try:
             with open(filepath, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                text = "\n".join(page.extract_text() for page in pdf_reader.pages)
                 
                 # Save to temporary text file
-                temp_path = self.temp_dir / f"{Path(filename).stem}.txt"
-                with open(temp_path, 'w', encoding='utf-8') as temp_file:
-                    temp_file.write(text)
+                if self.save_text:
+                    temp_path = self.temp_dir / f"{Path(filename).stem}.txt"
+                    with open(temp_path, 'w', encoding='utf-8') as temp_file:
+                        temp_file.write(text)
                 
                 return text.strip()
                 
@@ -102,7 +275,7 @@ class PaperProcessor:
                 print(f"Error deleting temporary file {txt_file}: {str(e)}")
 
 def main():
-    processor = PaperProcessor()
+    processor = PaperProcessor(save_text=True)
     try:
         results = processor.process_all_papers()
         
@@ -0,0 +1,127 @@
+import logging
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Set, Tuple
+
+from src.core.condition_parser import Leaf, CompiledCondition, FIELD_SECTIONS, NUMERIC_FIELDS
+from src.core.paper_index import condition_guards, leaf_keys, profile_keys
+
+logger = logging.getLogger(__name__)
+
+
+def numeric_profile(profile: Dict) -> Dict:
+    """
+    A copy of a profile with age, weight and height as floats, since saved profiles
+    may hold them as strings. Raises TypeError or ValueError if one isn't a number.
+    """
+    profile = dict(profile)
+    for field in NUMERIC_FIELDS:
+        section = FIELD_SECTIONS[field]
+        value = (profile.get(section) or {}).get(field)
+        if value is not None:
+            profile[section] = {**profile[section], field: float(value)}
+    return profile
+
+
+class ProfilePercolator:
+    """
+    Index of saved user profiles used to find the users a newly ingested paper matches.
+
+    Categorical values are indexed as posting lists of usernames (keyed like the
+    paper index, e.g. 'race=asian'), and age, weight and height as sorted
+    (value, username) lists. A new paper's guards select the users that could
+    satisfy its conditions, and only those are evaluated.
+    """
+
+    def __init__(self):
+        self._profiles: Dict[str, Dict] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._numeric: Dict[str, List[Tuple[float, str]]] = {field: [] for field in NUMERIC_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def replace(self, other: "ProfilePercolator") -> None:
+        """Take over the profiles indexed by other, e.g. a percolator rebuilt from scratch."""
+        self._profiles, self._postings, self._numeric = other._profiles, other._postings, other._numeric
+
+    def add_profile(self, username: str, profile: Dict) -> bool:
+        """
+        Index a saved profile, replacing any previous version.
+        A profile that can't be indexed is logged and left out, and False is returned.
+        """
+        self.remove_profile(username)
+        try:
+            profile = numeric_profile(profile)
+            keys = profile_keys(profile)
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.warning("Skipping saved profile %s: %s", username, e)
+            return False
+        self._profiles[username] = profile
+        for key in keys:
+            self._postings.setdefault(key, set()).add(username)
+        for field in NUMERIC_FIELDS:
+            value = (profile.get(FIELD_SECTIONS[field]) or {}).get(field)
+            if value is not None:
+                insort(self._numeric[field], (value, username))
+        return True
+
+    def remove_profile(self, username: str) -> None:
+        profile = self._profiles.pop(username, None)
+        if profile is None:
+            return
+        for key in profile_keys(profile):
+            users = self._postings.get(key)
+            if users is not None:
+                users.discard(username)
+                if not users:
+                    del self._postings[key]
+        for field in NUMERIC_FIELDS:
+            value = (profile.get(FIELD_SECTIONS[field]) or {}).get(field)
+            if value is not None:
+                entries = self._numeric[field]
+                position = bisect_left(entries, (value, username))
+                if position < len(entries) and entries[position] == (value, username):
+                    del entries[position]
+
+    def _leaf_users(self, leaf: Leaf) -> Set[str]:
+        """Users whose profile satisfies a single leaf."""
+        if leaf.kind == 'range':
+            entries = self._numeric[leaf.field]
+            start = bisect_left(entries, (leaf.low,))
+            end = bisect_right(entries, (leaf.high, chr(0x10FFFF)))
+            return {username for _, username in entries[start:end]}
+        users = set()
+        for key in leaf_keys(leaf):
+            users |= self._postings.get(key, set())
+        return users
+
+    def candidates(self, compiled: CompiledCondition) -> Set[str]:
+        """Users that could possibly satisfy a paper's compiled conditions."""
+        guards = condition_guards(compiled.root)
+        if not guards:
+            return set(self._profiles)
+
+        candidates = None
+        for guard in guards:
+            users = set()
+            for leaf in guard:
+                users |= self._leaf_users(leaf)
+            candidates = users if candidates is None else candidates & users
+            if not candidates:
+                break
+        return candidates
+
+    def match_paper(self, compiled: CompiledCondition) -> List[str]:
+        """
+        Find the saved users a paper matches.
+
+        Args:
+            compiled: the paper's compiled conditions
+
+        Returns:
+            List of matching usernames
+        """
+        return sorted(
+            username for username in self.candidates(compiled)
+            if compiled.evaluate(self._profiles[username])
+        )
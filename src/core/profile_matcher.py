@@ -1,12 +1,139 @@
 import json
+import logging
 import os
 from typing import Dict, List, Optional, Tuple
 
-from src.core.condition_parser import ConditionParser
+from src.core.condition_parser import ConditionParser, CompiledCondition
+from src.core.match_engine import MatchEngine
+from src.core.paper_index import PaperIndex
+
+logger = logging.getLogger(__name__)
 
 class ProfileMatcher:
     def __init__(self):
         self.condition_parser = ConditionParser()
+        # Compiled conditions by condition hash, and the hash each paper id compiled to
+        self._compiled: Dict[str, CompiledCondition] = {}
+        self._paper_keys: Dict[str, str] = {}
+        # Columnar catalog of every paper added through add_paper
+        self.engine = MatchEngine()
+        # Prunes the catalog down to papers a profile could possibly match
+        self.index = PaperIndex()
+
+    def add_paper(self, paper_id: str, paper_data: Dict) -> CompiledCondition:
+        """
+        Compile a paper and add it to the catalog evaluated by match_catalog.
+
+        Args:
+            paper_id: ID of the paper
+            paper_data: Dictionary containing the paper's ideal_profile and conditions
+
+        Returns:
+            CompiledCondition for the paper
+        """
+        compiled = self.compile_paper(paper_id, paper_data)
+        self.engine.add_paper(paper_id, compiled)
+        self.index.add_paper(paper_id, compiled)
+        return compiled
+
+    def has_paper(self, paper_id: str) -> bool:
+        return paper_id in self.engine
+
+    def catalog_ids(self) -> List[str]:
+        return self.engine.paper_ids()
+
+    def match_catalog(self, profile: Dict) -> List[str]:
+        """
+        Match a profile against the catalog, evaluating only the papers the index
+        reports as possible matches.
+
+        Args:
+            profile: Dictionary containing profile characteristics (enum values as strings)
+
+        Returns:
+            List of matching paper ids
+        """
+        candidates = self.index.candidates(profile)
+        logger.debug("Evaluating %d of %d papers after pruning", len(candidates), len(self.engine))
+        return self.engine.match(profile, rows=self.engine.rows_for(candidates))
+
+    def rank_catalog(self, profile: Dict, limit: Optional[int] = None, offset: int = 0) -> Tuple[List[Tuple[str, float]], int]:
+        """
+        Match a profile against the catalog and return one page of the best-scoring matches.
+
+        Args:
+            profile: Dictionary containing profile characteristics (enum values as strings)
+            limit: Maximum number of matches to return; None returns all of them
+            offset: Number of best matches to skip
+
+        Returns:
+            (paper_id, score) pairs from best to worst, and the total number of matches
+        """
+        candidates = self.index.candidates(profile)
+        return self.engine.rank(profile, rows=self.engine.rows_for(candidates), limit=limit, offset=offset)
+
+    def explain_catalog(self, profile: Dict) -> Dict[str, Dict]:
+        """
+        Trace the evaluation of a profile against every paper in the catalog.
+
+        Args:
+            profile: Dictionary containing profile characteristics (enum values as strings)
+
+        Returns:
+            Dict mapping paper id to its evaluation trace, including whether the index
+            kept the paper as a candidate
+        """
+        candidates = self.index.candidates(profile)
+        explanations = {}
+        for paper_id in self.engine.paper_ids():
+            explanation = self.get_compiled(paper_id).explain(profile)
+            explanation["candidate"] = paper_id in candidates
+            explanations[paper_id] = explanation
+        return explanations
+
+    def compile_paper(self, paper_id: str, paper_data: Dict) -> CompiledCondition:
+        """
+        Compile a paper's conditions against its ideal profile and cache the result.
+
+        Args:
+            paper_id: ID of the paper
+            paper_data: Dictionary containing the paper's ideal_profile and conditions
+
+        Returns:
+            CompiledCondition for the paper
+        """
+        key = self.condition_parser.condition_hash(paper_data.get('conditions'), paper_data.get('ideal_profile'))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self.condition_parser.compile(paper_data.get('conditions'), paper_data.get('ideal_profile') or {})
+            self._compiled[key] = compiled
+
+        previous = self._paper_keys.get(paper_id)
+        self._paper_keys[paper_id] = key
+        if previous and previous != key:
+            self._release(previous)
+        return compiled
+
+    def get_compiled(self, paper_id: str, paper_data: Optional[Dict] = None) -> CompiledCondition:
+        """
+        Return the cached compiled conditions for a paper, compiling them on first use.
+        """
+        key = self._paper_keys.get(paper_id)
+        if key is not None:
+            return self._compiled[key]
+        return self.compile_paper(paper_id, paper_data or {})
+
+    def forget_paper(self, paper_id: str) -> None:
+        """Drop a paper from the catalog and its compiled conditions from the cache."""
+        self.engine.remove_paper(paper_id)
+        self.index.remove_paper(paper_id)
+        key = self._paper_keys.pop(paper_id, None)
+        if key:
+            self._release(key)
+
+    def _release(self, key: str) -> None:
+        if key not in self._paper_keys.values():
+            self._compiled.pop(key, None)
         
     def match_profile_to_papers(self, profile_id: str) -> List[Tuple[str, str]]:
         """
@@ -24,7 +151,7 @@ class ProfileMatcher:
             
         matches = []
         for paper_id, paper_data in self._load_papers():
-            if self._is_match(profile, paper_data):
+            if self._is_match(profile, paper_data, paper_id=paper_id):
                 summary = self._get_paper_summary(paper_id)
                 if summary:
                     matches.append((paper_id, summary))
@@ -72,34 +199,30 @@ class ProfileMatcher:
                     
         return papers
     
-    def _is_match(self, profile: Dict, paper_data: Dict) -> bool:
+    def _is_match(self, profile: Dict, paper_data: Dict, paper_id: Optional[str] = None) -> bool:
         """
         Check if a profile matches the conditions specified in a paper.
         
         Args:
             profile: Dictionary containing profile characteristics
             paper_data: Dictionary containing paper data including conditions
+            paper_id: ID of the paper, used to reuse its compiled conditions
             
         Returns:
             bool: True if profile matches paper conditions, False otherwise
         """
-        print(f"Checking match with profile: {profile}")
-        print(f"Against paper data: {paper_data}")
-        
         if 'conditions' not in paper_data or 'ideal_profile' not in paper_data:
-            print("Missing conditions or ideal_profile in paper data")
+            logger.debug("Missing conditions or ideal_profile in paper data")
             return False
             
-        # Remove quotes from conditions if present
-        conditions = paper_data['conditions'].strip('"')
-        print(f"Evaluating conditions: {conditions}")
-        
-        result = self.condition_parser.parse_conditions(
-            conditions,
-            profile,
-            paper_data['ideal_profile']
-        )
-        print(f"Match result: {result}")
+        if paper_id is not None:
+            compiled = self.get_compiled(paper_id, paper_data)
+        else:
+            compiled = self._compiled.get(self.condition_parser.condition_hash(paper_data['conditions'], paper_data['ideal_profile']))
+            if compiled is None:
+                compiled = self.condition_parser.compile(paper_data['conditions'], paper_data['ideal_profile'])
+        result = compiled.evaluate(profile)
+        logger.debug("Match result for %s: %s", compiled, result)
         return result
     
     def _get_paper_summary(self, paper_id: str) -> Optional[str]:
@@ -0,0 +1,136 @@
+"""
+Generated papers and profiles shared by the matching tests.
+
+Papers carry the kind of ideal profiles and condition strings LLM output produces:
+ranges given as strings or reversed, values in the wrong case or with spaces, scalars
+where lists are expected and the other way round, unknown fields and malformed
+conditions. Profiles are valid CustomerProfiles, as every matching path receives them,
+but half of them are generated the way the frontend saves them, with age, weight
+and height as strings.
+"""
+import json
+import random
+from typing import Dict, List, Tuple
+
+import pytest
+
+from src.core.condition_parser import FIELD_SECTIONS, LIST_FIELDS, NUMERIC_FIELDS
+from src.core.match_engine import ENUM_FIELDS
+from src.core.profile_matcher import ProfileMatcher
+from src.models.profile import CustomerProfile
+
+SEED = 1234
+PAPER_COUNT = 300
+PROFILE_COUNT = 150
+
+# Ages, weights and heights are drawn from few values, so profiles often sit on range bounds
+NUMERIC_VALUES = {'age': range(20, 80, 5), 'weight': range(100, 300, 25), 'height': range(55, 80, 3)}
+
+
+def _enum_values(field: str) -> List[str]:
+    return [member.value for member in ENUM_FIELDS[field]]
+
+
+def _noisy(rng: random.Random, value: str) -> str:
+    """An enum value the way LLM output may spell it."""
+    return rng.choice([
+        value, value, value.upper(), value.replace('_', ' '), f" {value} ", value.replace('_', '-').title(),
+    ])
+
+
+def _ideal_value(rng: random.Random, field: str):
+    if field in NUMERIC_FIELDS:
+        low, high = sorted(rng.sample(list(NUMERIC_VALUES[field]), 2))
+        return rng.choice([
+            [low, high], [low, high], [str(low), str(high)], [high, low], [low, low],
+            [], [low, "inf"], [None, high], low, [low],
+        ])
+    values = _enum_values(field)
+    if field in LIST_FIELDS:
+        entries = [_noisy(rng, value) for value in rng.sample(values, rng.randrange(0, 3))]
+        return rng.choice([
+            entries, entries, entries + ["unknown_value"], entries[0] if entries else [], [{"nested": 1}] + entries,
+        ])
+    value = _noisy(rng, rng.choice(values))
+    return rng.choice([
+        value, value, value, [value, _noisy(rng, rng.choice(values))], [], "unknown_value", 1,
+    ])
+
+
+def _ideal_profile(rng: random.Random) -> Dict:
+    ideal = {}
+    for field, section in FIELD_SECTIONS.items():
+        if rng.random() < 0.85:
+            ideal.setdefault(section, {})[field] = _ideal_value(rng, field)
+    return ideal
+
+
+def _condition(rng: random.Random, depth: int = 0) -> str:
+    if depth >= 2 or rng.random() < 0.45:
+        name = rng.choice(list(FIELD_SECTIONS) * 4 + ["bmi", "true", "false", "Age"])
+        if name in LIST_FIELDS and rng.random() < 0.3:
+            name = name.replace('_', ' ')
+        return name
+    operator = rng.choice(["AND", "OR", "and", "or"])
+    children = [_condition(rng, depth + 1) for _ in range(rng.randrange(2, 4))]
+    joined = f" {operator} ".join(children)
+    return f"({joined})" if rng.random() < 0.6 else joined
+
+
+def _conditions(rng: random.Random):
+    conditions = _condition(rng)
+    return rng.choice([
+        conditions, conditions, conditions, conditions, conditions,
+        f"{conditions} AND", f"{conditions})", f"({conditions}", "", None,
+    ])
+
+
+def generate_papers(rng: random.Random, count: int) -> List[Tuple[str, Dict]]:
+    return [
+        (f"paper-{i}", {"ideal_profile": _ideal_profile(rng), "conditions": _conditions(rng)})
+        for i in range(count)
+    ]
+
+
+def generate_saved_profile(rng: random.Random) -> Dict:
+    """A profile as the frontend or an API client sends it."""
+    physical = {field: rng.choice(NUMERIC_VALUES[field]) for field in sorted(NUMERIC_FIELDS)}
+    if rng.random() < 0.5:
+        physical = {field: str(value) for field, value in physical.items()}
+    profile = {"physical": physical, "demographics": {}, "medical_history": {}, "lifestyle": {}}
+    for field in ENUM_FIELDS:
+        values = _enum_values(field)
+        section = profile[FIELD_SECTIONS[field]]
+        section[field] = rng.sample(values, rng.randrange(0, 4)) if field in LIST_FIELDS else rng.choice(values)
+    return profile
+
+
+def validated(profile: Dict) -> Dict:
+    """A profile validated as a CustomerProfile, with enum values as strings."""
+    return json.loads(CustomerProfile.parse_obj(profile).json())
+
+
+@pytest.fixture(scope="session")
+def papers() -> List[Tuple[str, Dict]]:
+    return generate_papers(random.Random(SEED), PAPER_COUNT)
+
+
+@pytest.fixture(scope="session")
+def saved_profiles() -> Dict[str, Dict]:
+    rng = random.Random(SEED + 1)
+    return {f"user-{i}": generate_saved_profile(rng) for i in range(PROFILE_COUNT)}
+
+
+@pytest.fixture(scope="session")
+def profiles(saved_profiles) -> Dict[str, Dict]:
+    return {username: validated(profile) for username, profile in saved_profiles.items()}
+
+
+@pytest.fixture(scope="session")
+def expected(papers, profiles) -> Dict[str, List[str]]:
+    """For every profile, the papers the straightforward tree evaluation matches, in catalog order."""
+    reference = ProfileMatcher()
+    return {
+        username: [paper_id for paper_id, paper in papers if reference._is_match(profile, paper, paper_id=paper_id)]
+        for username, profile in profiles.items()
+    }
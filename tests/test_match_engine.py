@@ -0,0 +1,82 @@
+"""MatchEngine and the in-memory catalog checked against the straightforward tree evaluation."""
+import random
+
+import pytest
+
+from src.core.match_engine import MatchEngine
+from src.core.profile_matcher import ProfileMatcher
+from tests.conftest import generate_papers
+
+
+def _check_rank(rank, profile, expected_ids):
+    """rank(profile, limit, offset) agrees with the expected matches, and its pages with the full order."""
+    ranked, total = rank(profile)
+    assert total == len(expected_ids)
+    assert sorted(paper_id for paper_id, _ in ranked) == sorted(expected_ids)
+
+    # Highest score first, ties in catalog order
+    order = {paper_id: position for position, paper_id in enumerate(expected_ids)}
+    assert ranked == sorted(ranked, key=lambda pair: (-pair[1], order[pair[0]]))
+
+    for limit, offset in [(1, 0), (5, 0), (5, 3), (10, 10), (3, total - 1), (5, total), (0, 0)]:
+        page, page_total = rank(profile, limit=limit, offset=max(offset, 0))
+        assert page_total == total
+        assert page == ranked[max(offset, 0):max(offset, 0) + limit]
+
+
+@pytest.fixture(scope="module")
+def engine(papers):
+    parser = ProfileMatcher().condition_parser
+    engine = MatchEngine()
+    for paper_id, paper in papers:
+        engine.add_paper(paper_id, parser.compile(paper["conditions"], paper["ideal_profile"] or {}))
+    return engine
+
+
+@pytest.fixture(scope="module")
+def matcher(papers):
+    matcher = ProfileMatcher()
+    for paper_id, paper in papers:
+        matcher.add_paper(paper_id, paper)
+    return matcher
+
+
+def test_engine_match_agrees_with_is_match(engine, profiles, expected):
+    for username, profile in profiles.items():
+        assert engine.match(profile) == expected[username], username
+
+
+def test_engine_rank_agrees_with_is_match(engine, profiles, expected):
+    for username, profile in profiles.items():
+        _check_rank(engine.rank, profile, expected[username])
+
+
+def test_catalog_match_agrees_with_is_match(matcher, profiles, expected):
+    for username, profile in profiles.items():
+        assert matcher.match_catalog(profile) == expected[username], username
+        _check_rank(matcher.rank_catalog, profile, expected[username])
+
+
+def test_catalog_agrees_after_removals_and_replacements(papers, profiles):
+    rng = random.Random(7)
+    matcher = ProfileMatcher()
+    for paper_id, paper in papers:
+        matcher.add_paper(paper_id, paper)
+
+    current = dict(papers)
+    for paper_id in rng.sample(list(current), len(current) // 4):
+        matcher.forget_paper(paper_id)
+        del current[paper_id]
+    replaced = rng.sample(list(current), len(current) // 4)
+    for paper_id, (_, paper) in zip(replaced, generate_papers(rng, len(replaced))):
+        matcher.add_paper(paper_id, paper)
+        current[paper_id] = paper
+
+    reference = ProfileMatcher()
+    for profile in profiles.values():
+        matched = [
+            paper_id for paper_id in matcher.catalog_ids()
+            if reference._is_match(profile, current[paper_id], paper_id=paper_id)
+        ]
+        assert matcher.match_catalog(profile) == matched
+        _check_rank(matcher.rank_catalog, profile, matched)
@@ -0,0 +1,59 @@
+"""MongoDB pushdown of the matching, checked against the straightforward tree evaluation."""
+import asyncio
+
+import mongomock
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from src.api.catalog import PushdownCatalog
+from src.api.database import Database
+from src.core.match_query import candidate_query, match_fields
+from src.core.profile_matcher import ProfileMatcher
+
+
+def _paper_document(catalog, paper_id, paper):
+    document = {"_id": paper_id, "title": paper_id, "processed_data": {**paper, "summary": ""}}
+    document["match_fields"] = catalog.match_fields(document)
+    return document
+
+
+def test_candidate_query_selects_every_match(papers, profiles, expected):
+    parser = ProfileMatcher().condition_parser
+    collection = mongomock.MongoClient().db.papers
+    collection.insert_many([
+        {"_id": paper_id, "match_fields": match_fields(parser.compile(paper["conditions"], paper["ideal_profile"] or {}))}
+        for paper_id, paper in papers
+    ])
+
+    pruned = 0
+    for username, profile in profiles.items():
+        candidates = {document["_id"] for document in collection.find(candidate_query(profile), {"_id": 1})}
+        assert set(expected[username]) <= candidates, username
+        pruned += len(papers) - len(candidates)
+    assert pruned > 0
+
+
+@pytest.fixture
+def database():
+    Database.db = AsyncMongoMockClient().db
+    yield Database.db
+    Database.db = None
+
+
+def test_pushdown_catalog_agrees_with_is_match(database, papers, profiles, expected):
+    catalog = PushdownCatalog(ProfileMatcher())
+
+    async def ranked_matches():
+        await database.papers.insert_many([_paper_document(catalog, paper_id, paper) for paper_id, paper in papers])
+        results = {}
+        for username, profile in profiles.items():
+            candidates, matcher = await catalog.matcher_for(profile)
+            ranked, total = matcher.rank_catalog(profile)
+            assert total == len(ranked)
+            assert set(candidates) == set(matcher.catalog_ids())
+            results[username] = sorted(paper_id for paper_id, _ in ranked)
+        return results
+
+    results = asyncio.run(ranked_matches())
+    for username in profiles:
+        assert results[username] == sorted(expected[username]), username
@@ -0,0 +1,55 @@
+"""PaperIndex pruning and IntervalIndex stabbing queries."""
+import random
+
+from src.core.interval_index import IntervalIndex
+from src.core.paper_index import PaperIndex
+from src.core.profile_matcher import ProfileMatcher
+
+
+def test_candidates_include_every_match(papers, profiles, expected):
+    parser = ProfileMatcher().condition_parser
+    index = PaperIndex()
+    for paper_id, paper in papers:
+        index.add_paper(paper_id, parser.compile(paper["conditions"], paper["ideal_profile"] or {}))
+
+    pruned = 0
+    for username, profile in profiles.items():
+        candidates = index.candidates(profile)
+        assert set(expected[username]) <= candidates, username
+        pruned += len(papers) - len(candidates)
+    # The generated papers give the index something to prune
+    assert pruned > 0
+
+
+def test_candidates_forget_removed_papers(papers, profiles):
+    parser = ProfileMatcher().condition_parser
+    index = PaperIndex()
+    for paper_id, paper in papers:
+        index.add_paper(paper_id, parser.compile(paper["conditions"], paper["ideal_profile"] or {}))
+    removed = {paper_id for paper_id, _ in papers[::3]}
+    for paper_id in removed:
+        index.remove_paper(paper_id)
+
+    assert len(index) == len(papers) - len(removed)
+    for profile in profiles.values():
+        assert not index.candidates(profile) & removed
+
+
+def test_interval_index_stab_agrees_with_scan():
+    rng = random.Random(3)
+    index = IntervalIndex()
+    intervals = {}
+    for item in range(500):
+        low = rng.randrange(0, 100)
+        high = low + rng.choice([0, 0, rng.randrange(0, 40), float("inf")])
+        if rng.random() < 0.1:
+            low = float("-inf")
+        intervals[index.add(low, high, item)] = (low, high, item)
+    for handle in rng.sample(list(intervals), 100):
+        index.remove(handle)
+        del intervals[handle]
+
+    assert len(index) == len(intervals)
+    for point in [-1, 0, 0.5, 17, 50, 99, 100, 139, 140, 1000]:
+        expected = sorted(item for low, high, item in intervals.values() if low <= point <= high)
+        assert sorted(index.stab(point)) == expected, point
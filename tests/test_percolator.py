@@ -0,0 +1,64 @@
+"""ProfilePercolator checked against the straightforward tree evaluation."""
+import random
+
+from src.core.percolator import ProfilePercolator
+from src.core.profile_matcher import ProfileMatcher
+
+
+def _users_matching(papers, expected):
+    users = {paper_id: [] for paper_id, _ in papers}
+    for username, paper_ids in expected.items():
+        for paper_id in paper_ids:
+            users[paper_id].append(username)
+    return {paper_id: sorted(usernames) for paper_id, usernames in users.items()}
+
+
+def test_match_paper_agrees_with_is_match(papers, saved_profiles, expected):
+    percolator = ProfilePercolator()
+    # Saved as sent, with age, weight and height possibly strings
+    for username, profile in saved_profiles.items():
+        assert percolator.add_profile(username, profile)
+
+    parser = ProfileMatcher().condition_parser
+    users = _users_matching(papers, expected)
+    for paper_id, paper in papers:
+        compiled = parser.compile(paper["conditions"], paper["ideal_profile"] or {})
+        assert set(users[paper_id]) <= percolator.candidates(compiled), paper_id
+        assert percolator.match_paper(compiled) == users[paper_id], paper_id
+
+
+def test_match_paper_agrees_after_removals_and_replacements(papers, saved_profiles, profiles, expected):
+    rng = random.Random(11)
+    percolator = ProfilePercolator()
+    for username, profile in saved_profiles.items():
+        percolator.add_profile(username, profile)
+
+    kept = dict(expected)
+    for username in rng.sample(list(saved_profiles), len(saved_profiles) // 3):
+        percolator.remove_profile(username)
+        del kept[username]
+    # Saving a profile again, here as another user's, replaces the indexed version
+    usernames = list(kept)
+    for username, other in zip(usernames[::2], usernames[1::2]):
+        percolator.add_profile(username, saved_profiles[other])
+        kept[username] = expected[other]
+
+    parser = ProfileMatcher().condition_parser
+    users = _users_matching(papers, kept)
+    assert len(percolator) == len(kept)
+    for paper_id, paper in papers:
+        compiled = parser.compile(paper["conditions"], paper["ideal_profile"] or {})
+        assert percolator.match_paper(compiled) == users[paper_id], paper_id
+
+
+def test_add_profile_skips_unusable_profiles(saved_profiles):
+    percolator = ProfilePercolator()
+    profile = next(iter(saved_profiles.values()))
+    assert percolator.add_profile("valid", profile)
+
+    assert not percolator.add_profile("age", {**profile, "physical": {**profile["physical"], "age": "thirty"}})
+    assert not percolator.add_profile("weight", {**profile, "physical": {**profile["physical"], "weight": [150]}})
+    assert not percolator.add_profile("section", {**profile, "demographics": "female"})
+    # A failed save of a known user leaves that user out rather than indexed as before
+    assert not percolator.add_profile("valid", {**profile, "physical": {**profile["physical"], "age": "n/a"}})
+    assert len(percolator) == 0